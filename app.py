@@ -7,12 +7,46 @@ st.set_page_config(
     layout="wide"
 )
 
-import yfinance as yf
 import pandas as pd
 import os
-import re
+import time
 from dotenv import load_dotenv
-from anthropic import Anthropic
+from anthropic import Anthropic, APITimeoutError
+
+from archive import get_archive
+from cache_backend import shared_cache
+from data import (
+    cache_period,
+    get_fundamentals_table,
+    get_market_snapshot,
+    get_peer_index,
+    get_request_counter,
+    get_stock_data,
+    is_market_open,
+    load_closes,
+    load_infos,
+    record_snapshot,
+)
+from deadline import Deadline
+from delta import analysis_inputs, delta_candidate, diff_inputs, market_inputs, prior_conclusions
+from formatting import (
+    format_ai_response,
+    format_analysis,
+    format_large_number,
+    format_percentage,
+    get_metric_status,
+)
+from fundamentals import NUMERIC_COLUMNS, TEXT_COLUMNS, QueryError
+from llm import IncompleteAnalysis, run_analysis
+from live import (
+    LIVE_CHART_BARS,
+    LIVE_FAST,
+    LIVE_POLL_SECONDS,
+    LIVE_SLOW,
+    start_live_session,
+    update_live_session,
+)
+from prewarm import start_prewarm_scheduler
 
 # In local development, load from .env
 # In Streamlit Cloud, it will use secrets
@@ -23,10 +57,6 @@ else:
     # When deployed to Streamlit Cloud, use st.secrets
     api_key = st.secrets.get("ANTHROPIC_API_KEY")
 
-# Define the Claude model to use
-# Use the model that's confirmed to work
-CLAUDE_MODEL = "claude-3-haiku-20240307"
-
 # App title and description
 st.title("AI Stock Advisor")
 st.markdown("Get AI-powered stock analysis from the perspective of famous investors")
@@ -48,224 +78,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Helper function to determine metric status (positive, neutral, negative)
-def get_metric_status(metric_name, value):
-    """
-    Determine if a metric is positive, neutral, or negative based on generally accepted standards.
-    Returns: "positive", "neutral", or "negative"
-    """
-    if value is None or value == 'N/A':
-        return "neutral"
-    
-    try:
-        value = float(value) if isinstance(value, str) and value.replace('.', '', 1).isdigit() else value
-        
-        # Valuation metrics - lower is generally better
-        if metric_name in ["P/E Ratio", "Forward P/E", "Price to Book"]:
-            if isinstance(value, (int, float)):
-                if metric_name == "P/E Ratio" or metric_name == "Forward P/E":
-                    if value < 15:
-                        return "positive"
-                    elif value < 25:
-                        return "neutral"
-                    else:
-                        return "negative"
-                elif metric_name == "Price to Book":
-                    if value < 1.5:
-                        return "positive"
-                    elif value < 3:
-                        return "neutral"
-                    else:
-                        return "negative"
-        
-        # Growth metrics - higher is generally better
-        elif metric_name in ["Revenue Growth", "Earnings Growth", "Dividend Yield", "Return on Equity"]:
-            if isinstance(value, (int, float)):
-                if metric_name == "Dividend Yield":
-                    if value > 0.03:  # > 3%
-                        return "positive"
-                    elif value > 0.01:  # > 1%
-                        return "neutral"
-                    elif value > 0:
-                        return "neutral"
-                    else:
-                        return "neutral"  # No dividend isn't necessarily bad
-                elif metric_name in ["Revenue Growth", "Earnings Growth"]:
-                    if value > 0.15:  # > 15%
-                        return "positive"
-                    elif value > 0.05:  # > 5%
-                        return "neutral"
-                    elif value > 0:
-                        return "neutral"
-                    else:
-                        return "negative"
-                elif metric_name == "Return on Equity":
-                    if value > 0.15:  # > 15%
-                        return "positive"
-                    elif value > 0.10:  # > 10%
-                        return "neutral"
-                    elif value > 0:
-                        return "neutral"
-                    else:
-                        return "negative"
-        
-        # Financial health metrics
-        elif metric_name == "Debt to Equity":
-            if isinstance(value, (int, float)):
-                if value < 0.5:
-                    return "positive"
-                elif value < 1.5:
-                    return "neutral"
-                else:
-                    return "negative"
-        
-        # Margin metrics
-        elif metric_name in ["Operating Margin", "Profit Margin"]:
-            if isinstance(value, (int, float)):
-                if value > 0.20:  # > 20%
-                    return "positive"
-                elif value > 0.10:  # > 10%
-                    return "neutral"
-                elif value > 0:
-                    return "neutral"
-                else:
-                    return "negative"
-        
-        # PEG Ratio
-        elif metric_name == "PEG Ratio":
-            if isinstance(value, (int, float)):
-                if value < 1:
-                    return "positive"
-                elif value < 2:
-                    return "neutral"
-                else:
-                    return "negative"
-    
-    except (ValueError, TypeError):
-        return "neutral"
-    
-    # Default case
-    return "neutral"
-
-# Helper function to enhance visual hierarchy of AI responses
-def format_ai_response(text):
-    """
-    Enhance the formatting of AI responses to improve visual hierarchy.
-    - Identifies and styles section headers
-    - Applies highlighting to key insights
-    - Formats lists better
-    """
-    # Find common section headers in investor analyses (like "Initial impression", "Business quality analysis", etc.)
-    enhanced_text = text
-    
-    # Convert section headers to styled headers with a color accent
-    # This pattern matches common section headers from the prompts
-    section_headers = [
-        "Initial impression", "Business quality analysis", "Management assessment", 
-        "Financial strength", "Valuation", "Risks and concerns", "Conclusion",
-        "Stock category", "The company's story", "Growth analysis and PEG ratio",
-        "Competitive position", "Potential catalysts", "Red flags or concerns",
-        "Macroeconomic positioning", "Debt and balance sheet analysis",
-        "Correlation with economic indicators", "Portfolio fit",
-        "Innovation category", "Addressable market analysis", "Growth metrics"
-    ]
-    
-    # Create a regex pattern that matches these headers (with or without colon)
-    headers_pattern = "|".join(section_headers)
-    section_pattern = rf'(^|\n)[ \t]*(?:\*\*)?(({headers_pattern})(:)?)(?:\*\*)?[ \t]*(\n|$)'
-    
-    # Replace with styled headers
-    enhanced_text = re.sub(
-        section_pattern, 
-        r'\1<div style="color:#1E88E5; font-size:22px; font-weight:bold; border-bottom:2px solid #1E88E5; margin-top:25px; margin-bottom:15px; padding-bottom:5px;">\2</div>', 
-        enhanced_text,
-        flags=re.IGNORECASE
-    )
-    
-    # Second pattern for other capitalized headers with colons
-    general_section_pattern = r'(^|\n)[ \t]*([A-Z][A-Za-z\s]+:)[ \t]*(\n|$)'
-    enhanced_text = re.sub(
-        general_section_pattern, 
-        r'\1<div style="color:#1E88E5; font-size:20px; font-weight:bold; margin-top:20px; margin-bottom:10px;">\2</div>', 
-        enhanced_text
-    )
-    
-    # Add emphasis to subsections (often marked with bold)
-    subsection_pattern = r'\*\*(.*?)\*\*:'
-    enhanced_text = re.sub(
-        subsection_pattern, 
-        r'<span style="color:#0D47A1; font-weight:bold; font-size:18px;">\1:</span>', 
-        enhanced_text
-    )
-    
-    # Highlight important metrics/numbers
-    metrics_pattern = r'([0-9]+(\.[0-9]+)?\s*%)|(\$[0-9]+(,[0-9]+)*(\.[0-9]+)?[KMBT]?)'
-    enhanced_text = re.sub(
-        metrics_pattern, 
-        r'<span style="color:#FF5722; font-weight:bold;">\g<0></span>', 
-        enhanced_text
-    )
-    
-    # Highlight buy/hold/sell recommendations with color-coded badges
-    def recommendation_replacement(match):
-        rec = match.group(1).lower()
-        if rec == 'buy':
-            return '<span style="background-color:#4CAF50; color:white; padding:3px 8px; border-radius:4px; font-weight:bold; text-transform:uppercase;">BUY</span>'
-        elif rec == 'sell':
-            return '<span style="background-color:#F44336; color:white; padding:3px 8px; border-radius:4px; font-weight:bold; text-transform:uppercase;">SELL</span>'
-        elif rec == 'hold':
-            return '<span style="background-color:#FF9800; color:white; padding:3px 8px; border-radius:4px; font-weight:bold; text-transform:uppercase;">HOLD</span>'
-        return match.group(0)
-    
-    recommendation_pattern = r'\b(buy|hold|sell)\b'
-    enhanced_text = re.sub(recommendation_pattern, recommendation_replacement, enhanced_text, flags=re.IGNORECASE)
-    
-    # Enhance bullet points to make them more visible
-    enhanced_text = enhanced_text.replace('- ', '• ')
-    
-    # Add paragraph spacing for better readability
-    enhanced_text = re.sub(r'(\n\n|\r\n\r\n)', r'<div style="margin-bottom:15px;"></div>', enhanced_text)
-    
-    # Final wrap with better spacing and font, but WITHOUT a background color
-    enhanced_text = f'''
-    <div style="line-height:1.6; font-size:16px; font-family: 'Segoe UI', Arial, sans-serif; padding:15px; border-radius:5px;">
-        {enhanced_text}
-    </div>
-    '''
-    
-    return enhanced_text
-
-# Helper function to format large numbers
-def format_large_number(num):
-    """Format large numbers with K, M, B suffixes."""
-    if num is None or num == 'N/A':
-        return 'N/A'
-    
-    try:
-        num = float(num)
-        if num >= 1_000_000_000:
-            return f"${num/1_000_000_000:.2f}B"
-        elif num >= 1_000_000:
-            return f"${num/1_000_000:.2f}M"
-        elif num >= 1_000:
-            return f"${num/1_000:.2f}K"
-        else:
-            return f"${num:.2f}"
-    except:
-        return str(num)
-
-# Helper function to format percentages
-def format_percentage(num):
-    """Format a decimal as a percentage."""
-    if num is None or num == 'N/A':
-        return 'N/A'
-    
-    try:
-        num = float(num)
-        return f"{num*100:.2f}%"
-    except:
-        return str(num)
-
 # Initialize Anthropic client
 try:
     anthropic = Anthropic(api_key=api_key)
@@ -275,6 +87,9 @@ except Exception as e:
     st.error(f"Failed to initialize Anthropic client. Check your API key. Error: {str(e)}")
     anthropic = None
 
+# Keep popular tickers and the market snapshot warm in the background (once per process)
+start_prewarm_scheduler(anthropic)
+
 # Create sidebar for user inputs
 with st.sidebar:
     st.header("Enter Stock Information")
@@ -287,7 +102,10 @@ with st.sidebar:
             "Intrinsic Value Calculation",
             "Technical Analysis",
             "Elliott Wave Analysis",
-            "Market Condition Analysis"
+            "Market Condition Analysis",
+            "Portfolio Risk Analysis",
+            "Stock Screener",
+            "Analysis Archive"
         ]
     )
     
@@ -303,24 +121,40 @@ with st.sidebar:
             ]
         )
     
+    if analysis_type == "Portfolio Risk Analysis":
+        holdings_text = st.text_area(
+            "Holdings (ticker and weight, one per line or comma separated)",
+            "AAPL: 30\nMSFT: 30\nJNJ: 20\nXOM: 20"
+        )
+    
+    if analysis_type == "Stock Screener":
+        screen_query = st.text_input(
+            "Screen (e.g. pe < 15 and roe > 0.15 and sector == 'Technology')",
+            "pe < 25 and roe > 0.15"
+        )
+        screen_universe = st.text_area(
+            "Add tickers to the screening universe (optional, comma separated)",
+            ""
+        )
+        st.caption("Columns: " + ", ".join(list(NUMERIC_COLUMNS) + list(TEXT_COLUMNS)))
+    
+    if analysis_type == "Analysis Archive":
+        archive_query = st.text_input("Search past analyses (e.g. \"margin of safety\" AND moat)", "")
+        archive_ticker_only = st.checkbox("Only the ticker above", value=True)
+        archive_since = st.date_input("From date", value=None)
+    
+    structured_output = st.checkbox("Structured output", help="Request the analysis as structured fields (sections, recommendation, value ranges, key metrics) instead of free text")
+    
+    incremental = st.checkbox("Incremental update", help="Update the last archived analysis of this ticker from only the data that changed since, instead of starting from scratch")
+    
+    fast_preview = st.checkbox("Fast preview", help="Show a quick answer from a small model while a larger model writes the full analysis")
+    
+    live_mode = st.checkbox("Live price mode", help="Poll 1-minute bars for the ticker and update the chart in place")
+    
     # Remove sidebar footer from here since we'll move it to the bottom
 
-# Function to get stock data
-@st.cache_data(ttl=3600)
-def get_stock_data(ticker, period="1y"):
-    try:
-        stock = yf.Ticker(ticker)
-        history = stock.history(period=period)
-        info = stock.info
-        
-        # Don't return the stock object as it's not serializable
-        return history, info
-    except Exception as e:
-        st.error(f"Error fetching data for {ticker}: {e}")
-        return None, None
-
 # Helper function to create a colored metric display
-def colored_metric(label, value, status=None):
+def colored_metric(label, value, status=None, help=None):
     """Create a color-coded metric display based on status"""
     if status is None:
         status = get_metric_status(label, value)
@@ -341,18 +175,265 @@ def colored_metric(label, value, status=None):
         delta_color = "off"  # Gray/neutral color
         delta = "Neutral"
     
-    return st.metric(label=label, value=value, delta=delta, delta_color=delta_color)
+    return st.metric(label=label, value=value, delta=delta, delta_color=delta_color, help=help)
+
+# Helper function to describe where a metric sits among peers
+def peer_help(peers, key):
+    """Tooltip text comparing a metric with its sector/industry peers, or None without peer data."""
+    if not peers:
+        return None
+    metric = peers['metrics'].get(key)
+    if not metric or metric['median'] is None:
+        return None
+    text = f"{peers['level'].title()} median ({peers['name']}): {metric['median']:.2f}"
+    if metric['percentile'] is not None:
+        text += f" - this company has a percentile rank of {metric['percentile']:.0f} among {peers['peer_count']} peers"
+    return text
+
+# Helper function to run a Claude analysis within what is left of the deadline
+def ask_claude(analysis_type, prompt, deadline, on_preliminary=None, structured=False):
+    """
+    (result, record) from run_analysis: the response text (or record_analysis fields, if
+    `structured`) and the call's model and token usage. None, with a warning, when the
+    budget runs out first or a structured answer stays cut off at its length limit.
+    """
+    if deadline.expired:
+        st.warning("The analysis ran out of time before the AI step; the data above is still shown.")
+        return None
+    try:
+        return run_analysis(anthropic, analysis_type, prompt, deadline.stage("llm"), on_preliminary, structured)
+    except APITimeoutError:
+        st.warning(f"The AI analysis did not finish within the {deadline.total:.0f}s budget; the data above is still shown.")
+        return None
+    except IncompleteAnalysis:
+        st.warning("The structured analysis was cut off at its length limit even after a retry; the data above is still shown.")
+        return None
+
+# Helper function to render a Claude analysis under a heading
+def show_analysis(title, prompt, deadline, subject, persona=None, inputs=None):
+    """
+    Run a Claude analysis, display it and archive it with its `inputs`. The latest full
+    archived analysis for the same subject, type and persona is shown while the fresh one
+    runs, and stays in place (with a warning) if the fresh one times out. With fast preview
+    on, a short answer from the fast model replaces it until the full analysis arrives.
+    
+    With incremental updates on, a recent full analysis is updated from only the inputs that
+    changed since it, or shown again when nothing material changed. Updates are archived as
+    deltas of that analysis, so later updates are always made against the full one.
+    """
+    st.subheader(title)
+    placeholder = st.empty()
+    
+    archived = get_archive().latest(subject, analysis_type, persona)
+    if archived is not None:
+        with placeholder.container():
+            st.caption(f"Archived analysis from {archived['created']:%Y-%m-%d %H:%M} "
+                       f"({archived['model'] or 'unknown model'}); a fresh analysis is being generated.")
+            st.markdown(format_analysis(archived['result']), unsafe_allow_html=True)
+    
+    route_as = analysis_type
+    delta_note = None
+    if incremental and delta_candidate(archived, inputs):
+        from prompts import get_delta_prompt
+        changes = diff_inputs(archived['inputs'], inputs)
+        if not changes:
+            with placeholder.container():
+                st.caption(f"No material changes since the analysis from {archived['created']:%Y-%m-%d %H:%M}; "
+                           "showing it again.")
+                st.markdown(format_analysis(archived['result']), unsafe_allow_html=True)
+            return
+        prompt = get_delta_prompt(subject, title, archived['created'], prior_conclusions(archived['result']), changes)
+        route_as = "Delta Update"
+        delta_note = (f"Update to the analysis from {archived['created']:%Y-%m-%d %H:%M}, "
+                      f"based on {len(changes)} changed inputs: {', '.join(label for _, label, _, _ in changes)}.")
+    
+    def show_preview(text):
+        with placeholder.container():
+            st.caption("Preliminary answer from the fast model; the full analysis is still running.")
+            st.markdown(format_ai_response(text), unsafe_allow_html=True)
+    
+    answer = ask_claude(route_as, prompt, deadline, show_preview if fast_preview else None, structured_output)
+    if answer is None:
+        if archived is not None:
+            with placeholder.container():
+                st.caption(f"Showing the archived analysis from {archived['created']:%Y-%m-%d %H:%M}.")
+                st.markdown(format_analysis(archived['result']), unsafe_allow_html=True)
+        else:
+            placeholder.empty()
+        return
+    
+    result, record = answer
+    with placeholder.container():
+        if delta_note:
+            st.caption(delta_note)
+        if record.get("truncated"):
+            st.caption("This analysis reached its length limit and may end abruptly; it is not archived.")
+        st.markdown(format_analysis(result), unsafe_allow_html=True)
+        if delta_note:
+            with st.expander("Previous analysis"):
+                st.markdown(format_analysis(archived['result']), unsafe_allow_html=True)
+    if not record.get("cached") and not record.get("truncated"):
+        get_archive().add(subject, analysis_type, result, prompt, persona=persona, as_of=cache_period(),
+                          model=record['model'], input_tokens=record['prompt_tokens'],
+                          output_tokens=record['output_tokens'], inputs=inputs,
+                          delta_of=archived['id'] if delta_note else None)
+
+# Live price panel: runs as a fragment so each poll only re-renders this panel
+# The fragment always polls, since run_every is only read on a full rerun; while the market
+# is closed it skips the fetch (after one last poll to pick up the final bar)
+@st.fragment(run_every=LIVE_POLL_SECONDS)
+def live_price_panel(symbol):
+    """Poll new intraday bars, extend the moving averages and show cross alerts."""
+    session = st.session_state.get("live_session")
+    market_open = is_market_open()
+    try:
+        if session is None or session["ticker"] != symbol:
+            session = start_live_session(symbol)
+            st.session_state["live_session"] = session
+        elif market_open or not session.get("updated_after_close"):
+            update_live_session(session)
+        session["updated_after_close"] = not market_open
+    except Exception as e:
+        st.error(f"Live data unavailable for {symbol}: {e}")
+        return
+    
+    store = session["store"]
+    if not len(store):
+        st.info(f"No intraday bars available for {symbol}.")
+        return
+    
+    st.subheader(f"Live: {symbol}")
+    close = store.close
+    live_col1, live_col2, live_col3 = st.columns(3)
+    live_col1.metric("Last Price", f"${close[-1]:.2f}",
+                     f"{close[-1] - close[-2]:+.2f}" if len(close) > 1 else None)
+    live_col2.metric("Last Bar", store.last_timestamp.strftime("%H:%M"))
+    live_col3.metric("New Bars", session["last_update_bars"])
+    
+    window = slice(-LIVE_CHART_BARS, None)
+    st.line_chart(pd.DataFrame({
+        'Price': close[window],
+        f'{LIVE_FAST}-Bar MA': store.moving_average(LIVE_FAST)[window],
+        f'{LIVE_SLOW}-Bar MA': store.moving_average(LIVE_SLOW)[window]
+    }, index=store.index[window]))
+    
+    for timestamp, cross in reversed(session["alerts"][-3:]):
+        if cross == "golden":
+            st.success(f"📈 **Golden Cross** at {timestamp:%H:%M}: {LIVE_FAST}-bar MA crossed above {LIVE_SLOW}-bar MA")
+        else:
+            st.error(f"📉 **Death Cross** at {timestamp:%H:%M}: {LIVE_FAST}-bar MA crossed below {LIVE_SLOW}-bar MA")
+    
+    if not market_open:
+        st.caption("Market is closed; live updates resume at the next open.")
+
+if live_mode and ticker:
+    live_price_panel(ticker.upper())
 
 # Main content based on selection
 if st.sidebar.button("Analyze"):
-    if not ticker:
+    # Overall latency budget for this run, split between the fetch and LLM stages
+    deadline = Deadline.for_analysis(analysis_type)
+    fetch_deadline = deadline.stage("fetch")
+    
+    if analysis_type == "Portfolio Risk Analysis":
+        with st.spinner("Analyzing portfolio..."):
+            try:
+                from portfolio import BENCHMARK, parse_holdings, summarize_portfolio
+                holdings = parse_holdings(holdings_text)
+                
+                # Load every holding plus the benchmark through the shared price stores
+                closes = load_closes(list(holdings) + [BENCHMARK], timeout=fetch_deadline.remaining())
+                summary = summarize_portfolio(holdings, closes, closes.get(BENCHMARK))
+                
+                st.subheader("Portfolio Risk Overview")
+                if summary['missing']:
+                    st.warning(f"No price data for: {', '.join(summary['missing'])}. Their weight was redistributed.")
+                
+                risk_col1, risk_col2, risk_col3, risk_col4 = st.columns(4)
+                risk_col1.metric("Annualized Volatility", format_percentage(summary['portfolio_volatility']))
+                risk_col2.metric("Beta to SPY", f"{summary['portfolio_beta']:.2f}" if summary['portfolio_beta'] is not None else "N/A")
+                risk_col3.metric("Max Drawdown", format_percentage(summary['portfolio_max_drawdown']))
+                risk_col4.metric("Annualized Return", format_percentage(summary['portfolio_annual_return']))
+                
+                st.markdown("**Holdings**")
+                st.dataframe(summary['holdings'].style.format({
+                    "Weight": "{:.1%}", "Annual Return": "{:.1%}", "Volatility": "{:.1%}",
+                    "Beta": "{:.2f}", "Max Drawdown": "{:.1%}", "Risk Contribution": "{:.1%}"
+                }))
+                
+                st.markdown("**Correlation Matrix**")
+                st.dataframe(summary['correlation'].style.format("{:.2f}").background_gradient(cmap="RdYlGn_r", vmin=-1, vmax=1))
+                
+                from prompts import get_portfolio_prompt
+                prompt = get_portfolio_prompt(summary)
+                show_analysis("Portfolio Risk Analysis", prompt, deadline, "PORTFOLIO",
+                              persona=", ".join(f"{symbol} {weight:.0%}" for symbol, weight in holdings.items()))
+            except ValueError as e:
+                st.error(str(e))
+            except Exception as e:
+                st.error(f"An error occurred during analysis: {str(e)}")
+    elif analysis_type == "Stock Screener":
+        with st.spinner("Screening..."):
+            try:
+                # Fetch any new tickers and add them to the fundamentals table
+                universe = [t.strip().upper() for t in screen_universe.replace("\n", ",").split(",") if t.strip()]
+                if universe:
+                    infos = load_infos(universe, timeout=fetch_deadline.remaining())
+                    for symbol, symbol_info in infos.items():
+                        record_snapshot(symbol, symbol_info)
+                    skipped = [symbol for symbol, symbol_info in infos.items() if symbol_info is None]
+                    if skipped:
+                        st.warning(f"Could not load in time: {', '.join(skipped)}. Screening the rest of the universe.")
+                
+                table = get_fundamentals_table()
+                started = time.perf_counter()
+                results = table.query(screen_query, order_by="market_cap", ascending=False)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                
+                st.subheader("Screener Results")
+                st.caption(f"{len(results)} of {len(table)} tickers matched in {elapsed_ms:.1f} ms")
+                st.dataframe(results)
+            except QueryError as e:
+                st.error(str(e))
+            except Exception as e:
+                st.error(f"An error occurred during screening: {str(e)}")
+    elif analysis_type == "Analysis Archive":
+        try:
+            archive = get_archive()
+            subject = ticker if archive_ticker_only and ticker else None
+            if archive_query.strip():
+                entries = archive.search(archive_query, subject=subject, since=archive_since)
+            else:
+                entries = archive.lookup(subject=subject, since=archive_since)
+            
+            st.subheader("Archived Analyses")
+            if not entries:
+                st.info("No archived analyses match.")
+            for entry in entries:
+                persona = f" / {entry['persona']}" if entry['persona'] else ""
+                update = " (incremental update)" if entry['delta_of'] else ""
+                with st.expander(f"{entry['created']:%Y-%m-%d %H:%M} - {entry['subject']} - {entry['analysis_type']}{persona}{update}"):
+                    st.caption(f"Model: {entry['model'] or 'unknown'} - data as of {entry['as_of'] or 'unknown'} - "
+                               f"{entry['input_tokens'] or 0} input / {entry['output_tokens'] or 0} output tokens")
+                    if entry.get('snippet'):
+                        st.markdown(f"> {entry['snippet']}")
+                    st.markdown(format_analysis(entry['result']), unsafe_allow_html=True)
+        except ValueError as e:
+            st.error(str(e))
+    elif not ticker:
         st.warning("Please enter a valid ticker symbol")
     else:
         # Remove the data attribution from here since we'll move it to bottom of sidebar
         with st.spinner(f"Analyzing {ticker}..."):
             try:
                 # Get stock data
-                history, info = get_stock_data(ticker)
+                persona = investor if analysis_type == "Famous Investor Analysis" else None
+                get_request_counter().record(ticker, (analysis_type, persona, structured_output))
+                history, info, price_store, notices = get_stock_data(ticker, deadline=fetch_deadline)
+                for notice in notices:
+                    st.warning(notice)
+                record_snapshot(ticker, info)
+                peers = get_peer_index().summary(ticker)
                 
                 if history is not None and not history.empty:
                     # Display basic stock info
@@ -400,7 +481,7 @@ if st.sidebar.button("Analyze"):
                         
                         with metrics_col1:
                             pe_ratio = round(info.get('trailingPE', 'N/A'), 2) if info.get('trailingPE') not in ['N/A', None] else 'N/A'
-                            colored_metric("P/E Ratio", pe_ratio)
+                            colored_metric("P/E Ratio", pe_ratio, help=peer_help(peers, 'trailingPE'))
                             
                             forward_pe = round(info.get('forwardPE', 'N/A'), 2) if info.get('forwardPE') not in ['N/A', None] else 'N/A'
                             colored_metric("Forward P/E", forward_pe)
@@ -420,38 +501,40 @@ if st.sidebar.button("Analyze"):
                         
                         with metrics_col3:
                             price_to_book = round(info.get('priceToBook', 'N/A'), 2) if info.get('priceToBook') not in ['N/A', None] else 'N/A'
-                            colored_metric("Price to Book", price_to_book)
+                            colored_metric("Price to Book", price_to_book, help=peer_help(peers, 'priceToBook'))
                             
                             roe = info.get('returnOnEquity', 'N/A')
-                            colored_metric("Return on Equity", format_percentage(roe))
+                            colored_metric("Return on Equity", format_percentage(roe), help=peer_help(peers, 'returnOnEquity'))
                             
                             debt_to_equity = round(info.get('debtToEquity', 'N/A'), 2) if info.get('debtToEquity') not in ['N/A', None] else 'N/A'
-                            colored_metric("Debt to Equity", debt_to_equity)
+                            colored_metric("Debt to Equity", debt_to_equity, help=peer_help(peers, 'debtToEquity'))
                         
                         with metrics_col4:
                             fcf = info.get('freeCashflow', 'N/A')
                             colored_metric("Free Cash Flow", format_large_number(fcf), "neutral")
                             
                             op_margins = info.get('operatingMargins', 'N/A')
-                            colored_metric("Operating Margin", format_percentage(op_margins))
+                            colored_metric("Operating Margin", format_percentage(op_margins), help=peer_help(peers, 'operatingMargins'))
                             
                             profit_margins = info.get('profitMargins', 'N/A')
-                            colored_metric("Profit Margin", format_percentage(profit_margins))
+                            colored_metric("Profit Margin", format_percentage(profit_margins), help=peer_help(peers, 'profitMargins'))
                     
                     # Enhanced price chart
                     st.subheader("Price History (1 Year)")
                     
-                    # Calculate 50-day and 200-day moving averages
+                    # Moving averages come from the shared indicator store, so the cached
+                    # history frame is never copied or written to
                     if not history.empty and len(history) > 200:
-                        history['MA50'] = history['Close'].rolling(window=50).mean()
-                        history['MA200'] = history['Close'].rolling(window=200).mean()
+                        close = price_store.close
+                        ma50 = price_store.moving_average(50)
+                        ma200 = price_store.moving_average(200)
                         
                         # Create a DataFrame for plotting
                         chart_data = pd.DataFrame({
-                            'Price': history['Close'],
-                            '50-Day MA': history['MA50'],
-                            '200-Day MA': history['MA200']
-                        })
+                            'Price': close,
+                            '50-Day MA': ma50,
+                            '200-Day MA': ma200
+                        }, index=price_store.index)
                         
                         # Plot with both moving averages
                         st.line_chart(chart_data)
@@ -460,25 +543,24 @@ if st.sidebar.button("Analyze"):
                         ma_col1, ma_col2 = st.columns(2)
                         
                         # Check if price is above 50-day MA
-                        price_above_ma50 = history['Close'].iloc[-1] > history['MA50'].iloc[-1]
-                        ma50_status = "positive" if price_above_ma50 else "negative"
+                        price_above_ma50 = close[-1] > ma50[-1]
                         ma_col1.metric("Price vs 50-Day MA", 
-                                 f"{'+' if price_above_ma50 else '-'}{abs(history['Close'].iloc[-1] - history['MA50'].iloc[-1]):.2f}",
+                                 f"{'+' if price_above_ma50 else '-'}{abs(close[-1] - ma50[-1]):.2f}",
                                  f"{'Above' if price_above_ma50 else 'Below'}", 
                                  delta_color="normal" if price_above_ma50 else "inverse")
                         
                         # Check if price is above 200-day MA
-                        price_above_ma200 = history['Close'].iloc[-1] > history['MA200'].iloc[-1]
-                        ma200_status = "positive" if price_above_ma200 else "negative"
+                        price_above_ma200 = close[-1] > ma200[-1]
                         ma_col2.metric("Price vs 200-Day MA", 
-                                  f"{'+' if price_above_ma200 else '-'}{abs(history['Close'].iloc[-1] - history['MA200'].iloc[-1]):.2f}",
+                                  f"{'+' if price_above_ma200 else '-'}{abs(close[-1] - ma200[-1]):.2f}",
                                   f"{'Above' if price_above_ma200 else 'Below'}", 
                                   delta_color="normal" if price_above_ma200 else "inverse")
                         
                         # Golden/Death Cross detection
-                        if history['MA50'].iloc[-1] > history['MA200'].iloc[-1] and history['MA50'].iloc[-20] <= history['MA200'].iloc[-20]:
+                        cross = price_store.cross_signal()
+                        if cross == "golden":
                             st.success("📈 **Golden Cross Alert**: 50-day MA recently crossed above 200-day MA - typically bullish")
-                        elif history['MA50'].iloc[-1] < history['MA200'].iloc[-1] and history['MA50'].iloc[-20] >= history['MA200'].iloc[-20]:
+                        elif cross == "death":
                             st.error("📉 **Death Cross Alert**: 50-day MA recently crossed below 200-day MA - typically bearish")
                     else:
                         # If not enough data for moving averages, just show the price chart
@@ -487,78 +569,50 @@ if st.sidebar.button("Analyze"):
                     # Handle different analysis types
                     if analysis_type == "Famous Investor Analysis":
                         from prompts import get_investor_prompt
-                        prompt = get_investor_prompt(investor, ticker, info)
-                        
-                        message = anthropic.messages.create(
-                            model=CLAUDE_MODEL,
-                            max_tokens=4000,
-                            messages=[
-                                {"role": "user", "content": prompt}
-                            ]
-                        )
-                        
-                        st.subheader(f"{investor}'s Analysis")
-                        st.markdown(format_ai_response(message.content[0].text), unsafe_allow_html=True)
+                        prompt = get_investor_prompt(investor, ticker, info, peers)
+                        show_analysis(f"{investor}'s Analysis", prompt, deadline, ticker, persona=investor,
+                                      inputs=analysis_inputs(info, price_store))
                         
                     elif analysis_type == "Intrinsic Value Calculation":
                         from prompts import get_intrinsic_value_prompt
-                        prompt = get_intrinsic_value_prompt(ticker, info)
+                        from valuation import compute_valuation
+                        valuation = compute_valuation(info)
+                        
+                        # Show the locally computed valuations before the model's interpretation
+                        st.subheader("Valuation Models")
+                        val_col1, val_col2, val_col3, val_col4 = st.columns(4)
+                        val_col1.metric("DCF Value", format_large_number(valuation['dcf']))
+                        val_col2.metric("Dividend Discount", format_large_number(valuation['ddm']))
+                        val_col3.metric("Graham Number", format_large_number(valuation['graham_number']))
+                        val_col4.metric("Margin of Safety", format_percentage(valuation['margin_of_safety']))
                         
-                        message = anthropic.messages.create(
-                            model=CLAUDE_MODEL,
-                            max_tokens=4000,
-                            messages=[
-                                {"role": "user", "content": prompt}
-                            ]
-                        )
+                        with st.expander("DCF Sensitivity (Discount Rate x Growth Rate)"):
+                            sensitivity = pd.DataFrame(
+                                valuation['dcf_grid'],
+                                index=[f"{r:.1%}" for r in valuation['grid_discount_rates']],
+                                columns=[f"{g:.0%}" for g in valuation['grid_growth_rates']]
+                            )
+                            st.dataframe(sensitivity)
                         
-                        st.subheader("Intrinsic Value Analysis")
-                        st.markdown(format_ai_response(message.content[0].text), unsafe_allow_html=True)
+                        prompt = get_intrinsic_value_prompt(ticker, info, valuation, peers)
+                        show_analysis("Intrinsic Value Analysis", prompt, deadline, ticker, inputs=analysis_inputs(info, price_store))
                         
                     elif analysis_type == "Technical Analysis":
                         from prompts import get_technical_analysis_prompt
                         prompt = get_technical_analysis_prompt(ticker, history)
-                        
-                        message = anthropic.messages.create(
-                            model=CLAUDE_MODEL,
-                            max_tokens=4000,
-                            messages=[
-                                {"role": "user", "content": prompt}
-                            ]
-                        )
-                        
-                        st.subheader("Technical Analysis")
-                        st.markdown(format_ai_response(message.content[0].text), unsafe_allow_html=True)
+                        show_analysis("Technical Analysis", prompt, deadline, ticker, inputs=analysis_inputs(info, price_store))
                         
                     elif analysis_type == "Elliott Wave Analysis":
                         from prompts import get_elliott_wave_analysis_prompt
                         prompt = get_elliott_wave_analysis_prompt(ticker, history)
-                        
-                        message = anthropic.messages.create(
-                            model=CLAUDE_MODEL,
-                            max_tokens=4000,
-                            messages=[
-                                {"role": "user", "content": prompt}
-                            ]
-                        )
-                        
-                        st.subheader("Elliott Wave Analysis")
-                        st.markdown(format_ai_response(message.content[0].text), unsafe_allow_html=True)
+                        show_analysis("Elliott Wave Analysis", prompt, deadline, ticker, inputs=analysis_inputs(info, price_store))
                         
                     elif analysis_type == "Market Condition Analysis":
                         from prompts import get_market_condition_prompt
-                        prompt = get_market_condition_prompt()
-                        
-                        message = anthropic.messages.create(
-                            model=CLAUDE_MODEL,
-                            max_tokens=4000,
-                            messages=[
-                                {"role": "user", "content": prompt}
-                            ]
-                        )
-                        
-                        st.subheader("Market Condition Analysis")
-                        st.markdown(format_ai_response(message.content[0].text), unsafe_allow_html=True)
+                        market_snapshot = get_market_snapshot(timeout=fetch_deadline.remaining())
+                        prompt = get_market_condition_prompt(market_snapshot)
+                        show_analysis("Market Condition Analysis", prompt, deadline, "MARKET",
+                                      inputs=market_inputs(market_snapshot))
                 else:
                     st.error(f"Could not fetch data for {ticker}. Please check the ticker symbol.")
             except Exception as e:
@@ -566,13 +620,17 @@ if st.sidebar.button("Analyze"):
 
 # Main content ends here
 
+# Per-layer stats of the shared data/LLM cache
+with st.sidebar.expander("Cache statistics"):
+    st.dataframe(pd.DataFrame(shared_cache().stats()).set_index("layer"))
+
 # Add attribution and app info at the bottom of the sidebar, outside all other sidebar elements
 st.sidebar.markdown("<br><br><br><br><br><br>", unsafe_allow_html=True)  # Add some space
 st.sidebar.markdown("<hr>", unsafe_allow_html=True)
 st.sidebar.markdown("""
 <div style="text-align: center; color: #888; font-size: 0.8rem; padding: 10px;">
     <p style="font-size: 1rem; margin-bottom: 10px;">AI Stock Advisor v1.0</p>
-    <p>Analysis powered by Claude 3 Haiku</p>
+    <p>Analysis powered by Claude</p>
     <p>Data provided by Yahoo Finance</p>
     <p style="font-style: italic; margin-top: 10px;">Not financial advice. For educational purposes only.</p>
 </div>
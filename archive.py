@@ -0,0 +1,232 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# SQLite file holding past analyses; override with ANALYSIS_ARCHIVE
+ARCHIVE_PATH = os.getenv("ANALYSIS_ARCHIVE", "analyses.db")
+
+# Rows returned by lookups and searches unless a limit is given
+DEFAULT_LIMIT = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    subject TEXT NOT NULL,
+    analysis_type TEXT NOT NULL,
+    persona TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL,
+    as_of TEXT,
+    prompt_hash TEXT NOT NULL,
+    model TEXT,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    structured INTEGER NOT NULL DEFAULT 0,
+    recommendation TEXT,
+    result TEXT NOT NULL,
+    inputs TEXT,
+    delta_of INTEGER REFERENCES analyses (id)
+);
+CREATE INDEX IF NOT EXISTS analyses_lookup ON analyses (subject, analysis_type, persona, created);
+CREATE INDEX IF NOT EXISTS analyses_created ON analyses (created);
+CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5 (
+    body, subject, analysis_type, persona,
+    tokenize = 'porter unicode61'
+);
+"""
+
+_COLUMNS = (
+    "id", "subject", "analysis_type", "persona", "created", "as_of", "prompt_hash", "model",
+    "input_tokens", "output_tokens", "structured", "recommendation", "result", "inputs", "delta_of",
+)
+
+# Columns added after the first release, created on archives that predate them
+_ADDED_COLUMNS = {
+    "inputs": "TEXT",
+    "delta_of": "INTEGER REFERENCES analyses (id)",
+}
+
+
+def prompt_hash(prompt):
+    """SHA-256 of a prompt, stored so identical inputs can be recognised."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def analysis_text(result):
+    """Plain text of a text or structured analysis, for the full-text index."""
+    if not isinstance(result, dict):
+        return result
+    parts = [result.get("summary") or ""]
+    for section in result.get("sections") or []:
+        parts.append(section.get("title", ""))
+        parts.append(section.get("body", ""))
+    for metric in result.get("key_metrics") or []:
+        parts.append(f"{metric.get('name', '')}: {metric.get('value', '')} {metric.get('comment', '')}")
+    return "\n".join(part for part in parts if part)
+
+
+class AnalysisArchive:
+    """
+    Past analyses in SQLite with an FTS5 index over their text.
+
+    Each entry is keyed by subject (a ticker, or MARKET / PORTFOLIO), analysis type and
+    persona (investor style, or ''), and keeps the prompt hash, data snapshot period, model
+    and token usage. Structured results are stored as JSON and returned as dicts. Incremental
+    updates are stored with `delta_of` set to the id of the full analysis they update.
+    """
+
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(analyses)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    self._connection.execute(f"ALTER TABLE analyses ADD COLUMN {column} {definition}")
+
+    def add(self, subject, analysis_type, result, prompt, persona=None, as_of=None, model=None,
+            input_tokens=None, output_tokens=None, inputs=None, delta_of=None):
+        """
+        Archive one analysis and index its text. `inputs` is the flat dict of data the analysis
+        was based on, kept for incremental re-analysis; `delta_of` is the id of the full
+        analysis an incremental update was made from. Returns the new entry id.
+        """
+        structured = isinstance(result, dict)
+        recommendation = result.get("recommendation") if structured else None
+        stored = json.dumps(result) if structured else result
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO analyses (subject, analysis_type, persona, created, as_of, prompt_hash, model, "
+                "input_tokens, output_tokens, structured, recommendation, result, inputs, delta_of) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (subject.upper(), analysis_type, persona or "", time.time(), as_of, prompt_hash(prompt), model,
+                 input_tokens, output_tokens, int(structured), recommendation, stored,
+                 json.dumps(inputs) if inputs is not None else None, delta_of)
+            )
+            self._connection.execute(
+                "INSERT INTO analyses_fts (rowid, body, subject, analysis_type, persona) VALUES (?, ?, ?, ?, ?)",
+                (cursor.lastrowid, analysis_text(result), subject.upper(), analysis_type, persona or "")
+            )
+            return cursor.lastrowid
+
+    def latest(self, subject, analysis_type, persona=None):
+        """Most recent full (not incremental) analysis for a subject, type and persona, or None."""
+        entries = self.lookup(subject, analysis_type, persona, limit=1, deltas=False)
+        return entries[0] if entries else None
+
+    def lookup(self, subject=None, analysis_type=None, persona=None, since=None, until=None, limit=DEFAULT_LIMIT,
+               deltas=True):
+        """
+        Analyses matching the given filters, newest first. `since` and `until` are dates or
+        datetimes; `until` is exclusive. With `deltas` false, incremental updates are left out.
+        """
+        conditions, params = self._filters(subject, analysis_type, persona, since, until)
+        if not deltas:
+            conditions.append("delta_of IS NULL")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT * FROM analyses {where} ORDER BY created DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def search(self, query, subject=None, analysis_type=None, persona=None, since=None, until=None,
+               limit=DEFAULT_LIMIT):
+        """
+        Full-text search over all archived analyses, best match first. `query` uses FTS5
+        syntax (words, "phrases", OR, NOT, prefix*). Each entry gets a highlighted `snippet`.
+        Raises ValueError for malformed queries.
+        """
+        conditions, params = self._filters(subject, analysis_type, persona, since, until, table="a")
+        where = "".join(f" AND {condition}" for condition in conditions)
+        try:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT a.*, snippet(analyses_fts, 0, '**', '**', ' ... ', 24) AS snippet "
+                    "FROM analyses_fts JOIN analyses a ON a.id = analyses_fts.rowid "
+                    f"WHERE analyses_fts MATCH ?{where} ORDER BY bm25(analyses_fts) LIMIT ?",
+                    (query, *params, limit)
+                ).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search: {e}")
+        return [self._entry(row) for row in rows]
+
+    def _filters(self, subject, analysis_type, persona, since, until, table="analyses"):
+        conditions, params = [], []
+        for column, value in (("subject", subject.upper() if subject else None),
+                              ("analysis_type", analysis_type), ("persona", persona)):
+            if value is not None:
+                conditions.append(f"{table}.{column} = ?")
+                params.append(value)
+        for op, value in ((">=", since), ("<", until)):
+            if value is not None:
+                if not isinstance(value, datetime):
+                    value = datetime(value.year, value.month, value.day)
+                conditions.append(f"{table}.created {op} ?")
+                params.append(value.timestamp())
+        return conditions, params
+
+    @staticmethod
+    def _entry(row):
+        """Archive row as a dict, with the result and inputs decoded and `created` as a datetime."""
+        entry = {column: row[column] for column in _COLUMNS}
+        entry["created"] = datetime.fromtimestamp(entry["created"])
+        entry["structured"] = bool(entry["structured"])
+        if entry["structured"]:
+            entry["result"] = json.loads(entry["result"])
+        if entry["inputs"] is not None:
+            entry["inputs"] = json.loads(entry["inputs"])
+        if "snippet" in row.keys():
+            entry["snippet"] = row["snippet"]
+        return entry
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """The process-wide analysis archive at ARCHIVE_PATH."""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = AnalysisArchive()
+        return _archive
+
+
+def main():
+    """Command line entry point: search the archive or list recent analyses for a ticker."""
+    parser = argparse.ArgumentParser(description="Search archived analyses")
+    parser.add_argument("query", nargs="?", help="Full-text query (omit to list recent analyses)")
+    parser.add_argument("--ticker", help="Only analyses of this ticker")
+    parser.add_argument("--type", dest="analysis_type", help="Only this analysis type")
+    parser.add_argument("--persona", help="Only this investor persona")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    archive = get_archive()
+    filters = {"subject": args.ticker, "analysis_type": args.analysis_type, "persona": args.persona}
+    if args.query:
+        entries = archive.search(args.query, limit=args.limit, **filters)
+    else:
+        entries = archive.lookup(limit=args.limit, **filters)
+
+    for entry in entries:
+        persona = f" / {entry['persona']}" if entry["persona"] else ""
+        update = f" (update of #{entry['delta_of']})" if entry["delta_of"] else ""
+        print(f"{entry['created']:%Y-%m-%d %H:%M}  {entry['subject']:<10} {entry['analysis_type']}{persona}{update}"
+              f"  [{entry['model'] or 'unknown model'}]")
+        if entry.get("snippet"):
+            print(f"    {entry['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
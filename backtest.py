@@ -0,0 +1,275 @@
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+from indicators import by_trading_date, rolling_mean
+
+TRADING_DAYS = 252
+
+# Cost per unit of position change (0.05% per side)
+DEFAULT_COST = 0.0005
+
+# Forward return horizons (trading days) used to score recommendations
+DEFAULT_HORIZONS = (21, 63, 126)
+
+# Archived analyses whose subject is not a single ticker
+NON_TICKER_SUBJECTS = ("MARKET", "PORTFOLIO")
+
+# Most archived analyses loaded for scoring
+MAX_SCORED = 10000
+
+RECOMMENDATIONS = ("buy", "hold", "sell")
+
+
+def price_matrix(closes):
+    """
+    Align closing prices for a universe into a (days x tickers) DataFrame.
+    `closes` maps ticker -> Series. Days where a ticker has no data are NaN.
+    """
+    frame = pd.concat({ticker: by_trading_date(close) for ticker, close in closes.items()}, axis=1, join="outer")
+    return frame.sort_index()
+
+
+def crossover_positions(close, fast=50, slow=200):
+    """Long (1) while the fast moving average is above the slow one, flat (0) otherwise."""
+    ma_fast = rolling_mean(close, fast)
+    ma_slow = rolling_mean(close, slow)
+    with np.errstate(invalid="ignore"):
+        return (ma_fast > ma_slow).astype(float)
+
+
+def trend_positions(close, window=200):
+    """Long while price closes above its moving average."""
+    with np.errstate(invalid="ignore"):
+        return (np.asarray(close, dtype=float) > rolling_mean(close, window)).astype(float)
+
+
+def momentum_positions(close, lookback=126):
+    """Long while the trailing `lookback`-day return is positive."""
+    close = np.asarray(close, dtype=float)
+    positions = np.zeros_like(close)
+    with np.errstate(invalid="ignore"):
+        positions[lookback:] = (close[lookback:] > close[:-lookback]).astype(float)
+    return positions
+
+
+# Signals available to run_backtest, keyed by name
+SIGNALS = {
+    "golden_cross": crossover_positions,
+    "trend_200": trend_positions,
+    "momentum_126": momentum_positions,
+}
+
+
+def backtest(close, positions, cost=DEFAULT_COST):
+    """
+    Vectorised backtest of position arrays against a (days x tickers) price matrix.
+
+    Positions decided on a bar's close earn the next bar's return, so there is no look-ahead.
+    Returns a dict of per-ticker arrays plus the daily strategy returns.
+    """
+    close = np.asarray(close, dtype=float)
+    positions = np.nan_to_num(np.asarray(positions, dtype=float))
+    if close.ndim == 1:
+        close = close[:, None]
+        positions = positions[:, None]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        asset_returns = close[1:] / close[:-1] - 1
+    asset_returns = np.nan_to_num(asset_returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+    held = positions[:-1]
+    turnover = np.abs(np.diff(positions, axis=0, prepend=0.0))[:-1]
+    strategy_returns = held * asset_returns - turnover * cost
+
+    days = np.maximum((~np.isnan(close[1:])).sum(axis=0), 1)
+    wealth = np.cumprod(1 + strategy_returns, axis=0)
+    peaks = np.maximum.accumulate(wealth, axis=0)
+
+    volatility = strategy_returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = strategy_returns.mean(axis=0) * TRADING_DAYS / volatility
+        hit_rate = ((held > 0) & (asset_returns > 0)).sum(axis=0) / (held > 0).sum(axis=0)
+
+    return {
+        "total_return": wealth[-1] - 1,
+        "cagr": wealth[-1] ** (TRADING_DAYS / days) - 1,
+        "volatility": volatility,
+        "sharpe": sharpe,
+        "max_drawdown": (wealth / peaks - 1).min(axis=0),
+        "exposure": (held > 0).sum(axis=0) / days,
+        "trades": (turnover > 0).sum(axis=0),
+        "hit_rate": hit_rate,
+        "buy_and_hold": np.cumprod(1 + asset_returns, axis=0)[-1] - 1,
+        "daily_returns": strategy_returns,
+    }
+
+
+def run_backtest(prices, signal="golden_cross", cost=DEFAULT_COST, **signal_args):
+    """
+    Backtest a named signal over a price matrix (DataFrame, days x tickers).
+    Returns a DataFrame of statistics with one row per ticker.
+    """
+    positions = SIGNALS[signal](prices.to_numpy(), **signal_args)
+    results = backtest(prices.to_numpy(), positions, cost)
+    results.pop("daily_returns")
+    return pd.DataFrame(results, index=prices.columns)
+
+
+def extract_recommendation(text):
+    """
+    Pull the buy/hold/sell call out of an analysis.
+    Prefers a word near "recommendation"; otherwise uses the last buy/hold/sell in the text.
+    Returns None when there is no recommendation.
+    """
+    if not text:
+        return None
+    match = re.search(r"recommendation[^.\n]{0,80}?\b(buy|hold|sell)\b", text, flags=re.IGNORECASE)
+    if match:
+        return match.group(1).lower()
+    matches = re.findall(r"\b(buy|hold|sell)\b", text, flags=re.IGNORECASE)
+    return matches[-1].lower() if matches else None
+
+
+def archived_recommendations(entries):
+    """
+    Turn AnalysisArchive entries into the records frame score_recommendations expects
+    (ticker, date, recommendation). Structured analyses use their recommendation field,
+    text ones extract_recommendation. Entries without a call, or not about one ticker, are skipped.
+    """
+    rows = []
+    for entry in entries:
+        if entry["subject"] in NON_TICKER_SUBJECTS:
+            continue
+        if entry["structured"]:
+            recommendation = (entry["recommendation"] or "").lower()
+        else:
+            recommendation = extract_recommendation(entry["result"])
+        if recommendation in RECOMMENDATIONS:
+            rows.append({"ticker": entry["subject"], "date": entry["created"], "recommendation": recommendation,
+                         "analysis_type": entry["analysis_type"], "persona": entry["persona"]})
+    return pd.DataFrame(rows, columns=["ticker", "date", "recommendation", "analysis_type", "persona"])
+
+
+def forward_returns(prices, tickers, dates, horizon):
+    """
+    Return over `horizon` trading days after each (ticker, date) pair, looked up in one pass.
+    Dates falling between trading days use the next trading day. NaN when out of range.
+    """
+    values = prices.to_numpy()
+    columns = prices.columns.get_indexer(tickers)
+    dates = pd.DatetimeIndex(pd.to_datetime(dates)).tz_localize(None).normalize()
+    rows = prices.index.searchsorted(dates, side="left")
+    ends = rows + horizon
+
+    valid = (columns >= 0) & (ends < len(values))
+    result = np.full(len(rows), np.nan)
+    start_prices = values[rows[valid], columns[valid]]
+    end_prices = values[ends[valid], columns[valid]]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result[valid] = end_prices / start_prices - 1
+    return result
+
+
+def score_recommendations(records, prices, horizons=DEFAULT_HORIZONS, benchmark=None):
+    """
+    Score archived recommendations against realised forward returns.
+
+    records: DataFrame with ticker, date and recommendation columns (buy/hold/sell)
+    prices: price matrix covering the tickers (see price_matrix)
+    benchmark: optional column of `prices` to compute excess returns against
+    Returns (scored records, summary by recommendation and horizon).
+    """
+    records = records.copy()
+    records["recommendation"] = records["recommendation"].str.lower()
+    tickers = records["ticker"].str.upper().to_numpy()
+
+    summary_rows = []
+    for horizon in horizons:
+        column = f"return_{horizon}d"
+        records[column] = forward_returns(prices, tickers, records["date"], horizon)
+        if benchmark is not None:
+            benchmark_returns = forward_returns(prices, [benchmark] * len(records), records["date"], horizon)
+            records[column] = records[column] - benchmark_returns
+
+        for recommendation in RECOMMENDATIONS:
+            returns = records.loc[records["recommendation"] == recommendation, column].dropna()
+            if recommendation == "buy":
+                correct = (returns > 0).mean()
+            elif recommendation == "sell":
+                correct = (returns < 0).mean()
+            else:
+                correct = np.nan
+            summary_rows.append({
+                "horizon_days": horizon,
+                "recommendation": recommendation,
+                "count": len(returns),
+                "mean_return": returns.mean() if len(returns) else np.nan,
+                "median_return": returns.median() if len(returns) else np.nan,
+                "hit_rate": correct if len(returns) else np.nan,
+            })
+
+    return records, pd.DataFrame(summary_rows)
+
+
+def _download_prices(tickers, **options):
+    """Adjusted closing prices from Yahoo as a price matrix."""
+    import yfinance as yf
+
+    data = yf.download(tickers, auto_adjust=True, progress=False, **options)["Close"]
+    if isinstance(data, pd.Series):
+        data = data.to_frame(tickers[0])
+    return price_matrix({ticker: data[ticker] for ticker in data.columns})
+
+
+def score_archive(tickers=None, benchmark=None, horizons=DEFAULT_HORIZONS):
+    """
+    Score the buy/hold/sell calls in the analysis archive (optionally only for `tickers`)
+    against the prices that followed. Returns score_recommendations' (records, summary).
+    """
+    from archive import get_archive
+
+    archive = get_archive()
+    if tickers:
+        entries = [entry for ticker in tickers for entry in archive.lookup(subject=ticker, limit=MAX_SCORED)]
+    else:
+        entries = archive.lookup(limit=MAX_SCORED)
+    records = archived_recommendations(entries)
+    if records.empty:
+        raise ValueError("No archived buy/hold/sell calls to score")
+
+    symbols = sorted(set(records["ticker"]) | ({benchmark} if benchmark else set()))
+    start = (records["date"].min() - pd.Timedelta(days=7)).strftime("%Y-%m-%d")
+    prices = _download_prices(symbols, start=start)
+    return score_recommendations(records, prices, horizons, benchmark)
+
+
+def main():
+    """Command line entry point: backtest a signal over a universe, or score archived calls."""
+    parser = argparse.ArgumentParser(description="Backtest an indicator signal over a universe of tickers")
+    parser.add_argument("tickers", nargs="*", help="Ticker symbols (with --score-archive: only these tickers)")
+    parser.add_argument("--signal", choices=sorted(SIGNALS), default="golden_cross")
+    parser.add_argument("--period", default="10y", help="History period to download (default: 10y)")
+    parser.add_argument("--cost", type=float, default=DEFAULT_COST, help="Cost per unit of position change")
+    parser.add_argument("--score-archive", action="store_true",
+                        help="Score archived buy/hold/sell calls against the returns that followed")
+    parser.add_argument("--benchmark", help="With --score-archive: score returns in excess of this ticker")
+    args = parser.parse_args()
+    pd.set_option("display.float_format", "{:.3f}".format)
+
+    if args.score_archive:
+        _, summary = score_archive([t.upper() for t in args.tickers], args.benchmark)
+        print(summary.to_string(index=False))
+        return
+
+    if not args.tickers:
+        parser.error("at least one ticker is required")
+    prices = _download_prices(args.tickers, period=args.period)
+    results = run_backtest(prices, args.signal, args.cost)
+    print(results.sort_values("sharpe", ascending=False).to_string())
+
+
+if __name__ == "__main__":
+    main()
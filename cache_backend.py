@@ -0,0 +1,578 @@
+import argparse
+import os
+import pickle
+import socket
+import socketserver
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# Shared cache configuration: "memory", "sqlite:///path/to/cache.db" or "redis://host:port/db"
+DEFAULT_BACKEND = "memory"
+
+# Limits for the in-process layer
+MEMORY_MAX_ENTRIES = 2000
+MEMORY_MAX_BYTES = 64 * 1024 * 1024
+
+# Entries kept in a SQLite cache file before the least recently used are evicted
+SQLITE_MAX_ENTRIES = 50000
+
+# Seconds to wait for a Redis server before treating the call as a miss, and to wait after a
+# failed connection before trying again (calls in between are misses)
+REDIS_TIMEOUT = 2
+REDIS_RETRY_AFTER = 30
+
+# Values larger than this are zlib-compressed
+COMPRESS_ABOVE = 512
+
+# First byte of a serialized value: flags for compression and a stored expiry time
+_COMPRESSED = 0x01
+_EXPIRES = 0x02
+_EXPIRY = struct.Struct(">d")
+
+
+def serialize(value, expires=None):
+    """
+    Pickle a value, compressing it when that makes it smaller. `expires` (a time.time()
+    timestamp) travels with the value, so it survives being copied between layers. Returns bytes.
+    """
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    flags = 0
+    if len(data) > COMPRESS_ABOVE:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            data = compressed
+            flags |= _COMPRESSED
+    header = b""
+    if expires is not None:
+        flags |= _EXPIRES
+        header = _EXPIRY.pack(expires)
+    return bytes([flags]) + header + data
+
+
+def blob_expiry(blob):
+    """Expiry timestamp stored in a serialized value, or None if it does not expire."""
+    if blob[0] & _EXPIRES:
+        return _EXPIRY.unpack_from(blob, 1)[0]
+    return None
+
+
+def deserialize(blob):
+    """Inverse of serialize."""
+    flags = blob[0]
+    data = blob[1 + _EXPIRY.size:] if flags & _EXPIRES else blob[1:]
+    if flags & _COMPRESSED:
+        data = zlib.decompress(data)
+    return pickle.loads(data)
+
+
+class CacheBackend:
+    """
+    Byte-oriented key/value store with optional per-entry TTL.
+
+    Subclasses implement `_get`, `_set` and `_delete`; hit/miss/error counting is done here.
+    Evictions are counted by the backends that evict locally.
+    """
+
+    name = "backend"
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def get(self, key):
+        """Stored bytes for key, or None when missing, expired or the backend is unreachable."""
+        try:
+            blob = self._get(key)
+        except (OSError, sqlite3.Error, RedisError):
+            self._count("errors")
+            blob = None
+        self._count("hits" if blob is not None else "misses")
+        return blob
+
+    def set(self, key, blob, ttl=None):
+        """Store bytes for key, expiring after `ttl` seconds if given. Failures are counted, not raised."""
+        try:
+            self._set(key, blob, ttl)
+        except (OSError, sqlite3.Error, RedisError):
+            self._count("errors")
+
+    def delete(self, key):
+        try:
+            self._delete(key)
+        except (OSError, sqlite3.Error, RedisError):
+            self._count("errors")
+
+    def stats(self):
+        """Hit/miss/eviction/error counters for this layer."""
+        with self._stats_lock:
+            return {
+                "layer": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "errors": self.errors,
+            }
+
+    def _count(self, counter, amount=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, blob, ttl):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU bounded by entry count and total bytes."""
+
+    name = "memory"
+
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES, max_bytes=MEMORY_MAX_BYTES):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            blob, expires = entry
+            if expires is not None and expires < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return blob
+
+    def _set(self, key, blob, ttl):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (blob, expires)
+            self._bytes += len(blob)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._count("evictions")
+
+    def _delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        blob, _ = self._entries.pop(key)
+        self._bytes -= len(blob)
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(entries=len(self._entries), bytes=self._bytes)
+        return stats
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache in a SQLite file, shared by every process on the host (WAL mode allows concurrent
+    readers). Least recently used entries are evicted past `max_entries`.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, max_entries=SQLITE_MAX_ENTRIES):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, accessed REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] < now:
+                self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            return bytes(row[0])
+
+    def _set(self, key, blob, ttl):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(blob), now + ttl if ttl else None, now)
+            )
+            count = self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                # Expired entries go first, then the least recently used
+                removed = self._connection.execute("DELETE FROM cache WHERE expires < ?", (now,)).rowcount
+                excess = count - removed - self.max_entries
+                if excess > 0:
+                    removed += self._connection.execute(
+                        "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)", (excess,)
+                    ).rowcount
+                self._count("evictions", removed)
+
+    def _delete(self, key):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            entries, size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache").fetchone()
+        stats.update(entries=entries, bytes=size)
+        return stats
+
+
+class RedisError(Exception):
+    """Error reply from a Redis server, or a malformed response."""
+
+
+class RedisBackend(CacheBackend):
+    """
+    Cache on a Redis-protocol server, shared by every replica. Uses a minimal RESP client
+    (GET/SET/DEL) over one socket per backend; evictions happen on the server, per its
+    maxmemory policy, so they are not counted here.
+    """
+
+    name = "redis"
+
+    def __init__(self, host="localhost", port=6379, db=0, timeout=REDIS_TIMEOUT):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._socket = None
+        self._reader = None
+        self._down_until = 0
+
+    def command(self, *args):
+        """
+        Send one command and return its decoded reply. Reconnects once on a broken connection;
+        if that fails too, the server is not contacted again for REDIS_RETRY_AFTER seconds.
+        """
+        with self._lock:
+            if time.monotonic() < self._down_until:
+                raise ConnectionError(f"Cache server {self.host}:{self.port} is unavailable")
+            try:
+                return self._roundtrip(args)
+            except OSError:
+                pass
+            try:
+                return self._roundtrip(args)
+            except OSError:
+                self._down_until = time.monotonic() + REDIS_RETRY_AFTER
+                raise
+
+    def _roundtrip(self, args):
+        if self._socket is None:
+            self._connect()
+        try:
+            self._socket.sendall(_encode_command(args))
+            return _read_reply(self._reader)
+        except OSError:
+            self._close()
+            raise
+
+    def _connect(self):
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._socket.makefile("rb")
+        if self.db:
+            self._socket.sendall(_encode_command(("SELECT", self.db)))
+            _read_reply(self._reader)
+
+    def _close(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._reader = None
+
+    def _get(self, key):
+        return self.command("GET", key)
+
+    def _set(self, key, blob, ttl):
+        if ttl:
+            self.command("SET", key, blob, "PX", int(ttl * 1000))
+        else:
+            self.command("SET", key, blob)
+
+    def _delete(self, key):
+        self.command("DEL", key)
+
+
+def _encode_command(args):
+    """RESP encoding of a command as an array of bulk strings."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        else:
+            data = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def _read_reply(reader):
+    """Read one RESP reply. Bulk strings are returned as bytes, simple strings as str."""
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode("utf-8")
+    if kind == b"-":
+        raise RedisError(payload.decode("utf-8"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [_read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply: {line!r}")
+
+
+class LayeredCache:
+    """
+    Read-through stack of backends, fastest first (e.g. memory over Redis).
+
+    Values are serialized once, with their expiry time, and written to every layer. A hit in
+    a lower layer is copied into the layers above it for the rest of its lifetime, so the
+    next read for the key stays in-process.
+    """
+
+    def __init__(self, layers):
+        self.layers = list(layers)
+
+    def get(self, key):
+        """Cached value for key, or None."""
+        for position, layer in enumerate(self.layers):
+            blob = layer.get(key)
+            if blob is None:
+                continue
+            expires = blob_expiry(blob)
+            ttl = None
+            if expires is not None:
+                ttl = expires - time.time()
+                if ttl <= 0:
+                    continue
+            for upper in self.layers[:position]:
+                upper.set(key, blob, ttl)
+            return deserialize(blob)
+        return None
+
+    def set(self, key, value, ttl=None):
+        """Store a value in every layer."""
+        blob = serialize(value, time.time() + ttl if ttl else None)
+        for layer in self.layers:
+            layer.set(key, blob, ttl)
+
+    def delete(self, key):
+        for layer in self.layers:
+            layer.delete(key)
+
+    def get_or_set(self, key, compute, ttl=None):
+        """Cached value for key, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        """Per-layer hit/miss/eviction/error counters, fastest layer first."""
+        return [layer.stats() for layer in self.layers]
+
+
+def backend_from_url(url):
+    """Backend for a CACHE_BACKEND setting."""
+    if url in ("", "memory"):
+        return MemoryBackend()
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        # sqlite:///relative.db and sqlite:////absolute/path.db
+        return SQLiteBackend(parsed.path[1:] if url.startswith("sqlite:///") else parsed.path)
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return RedisBackend(parsed.hostname or "localhost", parsed.port or 6379, db)
+    raise ValueError(f"Unsupported CACHE_BACKEND: {url}")
+
+
+def build_cache(url=None):
+    """In-process memory layer, plus the configured shared layer when it is not memory itself."""
+    url = url if url is not None else os.getenv("CACHE_BACKEND", DEFAULT_BACKEND)
+    shared = backend_from_url(url)
+    if isinstance(shared, MemoryBackend):
+        return LayeredCache([shared])
+    return LayeredCache([MemoryBackend(), shared])
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def shared_cache():
+    """The process-wide cache used by the data and LLM caches, configured by CACHE_BACKEND."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = build_cache()
+        return _shared_cache
+
+
+def cache_key(*parts):
+    """Cache key from its parts, namespaced so several apps can share one server."""
+    return "stock-advisor:" + ":".join(str(part) for part in parts)
+
+
+class MiniRedis(socketserver.ThreadingTCPServer):
+    """
+    Small in-memory Redis-protocol server for local testing of the shared cache: supports
+    PING, SELECT, GET, SET (with EX/PX), DEL, EXISTS, DBSIZE, FLUSHDB and FLUSHALL, with LRU
+    eviction past `max_keys`.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("127.0.0.1", 6379), max_keys=100000):
+        super().__init__(address, _MiniRedisHandler)
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def execute(self, args):
+        """Run one command; returns the reply value, or an Exception for error replies."""
+        command = args[0].decode("utf-8").upper()
+        with self.lock:
+            self._expire()
+            if command == "PING":
+                return "PONG"
+            if command == "SELECT":
+                return "OK"
+            if command == "GET":
+                entry = self.data.get(args[1])
+                if entry is None:
+                    return None
+                self.data.move_to_end(args[1])
+                return entry[0]
+            if command == "SET":
+                expires = None
+                options = [a.decode("utf-8").upper() for a in args[3::2]]
+                for option, value in zip(options, args[4::2]):
+                    if option == "EX":
+                        expires = time.time() + int(value)
+                    elif option == "PX":
+                        expires = time.time() + int(value) / 1000
+                self.data[args[1]] = (args[2], expires)
+                self.data.move_to_end(args[1])
+                while len(self.data) > self.max_keys:
+                    self.data.popitem(last=False)
+                return "OK"
+            if command == "DEL":
+                return sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+            if command == "EXISTS":
+                return sum(1 for key in args[1:] if key in self.data)
+            if command == "DBSIZE":
+                return len(self.data)
+            if command in ("FLUSHDB", "FLUSHALL"):
+                self.data.clear()
+                return "OK"
+        return RedisError(f"ERR unknown command '{command}'")
+
+    def _expire(self):
+        now = time.time()
+        expired = [key for key, (_, expires) in self.data.items() if expires is not None and expires < now]
+        for key in expired:
+            del self.data[key]
+
+
+class _MiniRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                args = _read_reply(self.rfile)
+            except (ConnectionError, OSError):
+                return
+            if not isinstance(args, list) or not args:
+                return
+            self.wfile.write(_encode_reply(self.server.execute(args)))
+
+
+def _encode_reply(value):
+    """RESP encoding of a reply value."""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Exception):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def main():
+    """Command line entry point: run a local Redis stand-in, or print the configured cache's stats."""
+    parser = argparse.ArgumentParser(description="Shared cache tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    serve = subcommands.add_parser("serve", help="Run a local Redis-compatible cache server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=6379)
+    serve.add_argument("--max-keys", type=int, default=100000)
+    subcommands.add_parser("stats", help="Print per-layer stats of the CACHE_BACKEND cache")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = MiniRedis((args.host, args.port), args.max_keys)
+        print(f"Serving on {args.host}:{args.port} (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        for layer in shared_cache().stats():
+            print(", ".join(f"{key}={value}" for key, value in layer.items()))
+
+
+if __name__ == "__main__":
+    main()
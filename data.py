@@ -0,0 +1,311 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import streamlit as st
+import yfinance as yf
+
+from cache_backend import cache_key, shared_cache
+from deadline import YAHOO_HEDGE_AFTER, YAHOO_TIMEOUT, DeadlineExceeded, hedged_call
+from fundamentals import FundamentalsTable
+from indicators import IndicatorStore
+from peers import PeerIndex
+from snapshot import FundamentalsSnapshot, SnapshotCache
+
+# US equity market hours (exchange holidays are treated as trading days)
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = time(9, 30)
+MARKET_CLOSE = time(16, 0)
+
+# Cached entries are keyed by cache period, so old periods only need to outlive a weekend
+CACHE_TTL = timedelta(days=3)
+MAX_CACHED_TICKERS = 500
+
+# Market snapshot symbols and sector ETF names
+MARKET_SYMBOLS = ["SPY", "QQQ", "IWM", "^VIX"]
+SECTOR_ETFS = {
+    "XLK": "Technology",
+    "XLF": "Financial",
+    "XLV": "Healthcare",
+    "XLE": "Energy",
+    "XLY": "Consumer Discretionary",
+    "XLP": "Consumer Staples",
+    "XLI": "Industrial",
+    "XLB": "Materials",
+    "XLU": "Utilities",
+    "XLRE": "Real Estate",
+    "XLC": "Communication Services"
+}
+
+
+def is_market_open(now=None):
+    """True during regular US trading hours."""
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def last_close_date(now=None):
+    """Date of the most recent completed trading session."""
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    day = now.date()
+    if now.weekday() >= 5 or now.time() < MARKET_CLOSE:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def cache_period(now=None):
+    """
+    Cache key for market data fetched at `now`.
+    Hourly while the market is open; one period covering the whole time the market is closed,
+    so overnight and weekend requests reuse the data fetched after the last close.
+    """
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    if is_market_open(now):
+        return now.strftime("%Y-%m-%d %H:00")
+    return f"closed {last_close_date(now).isoformat()}"
+
+
+# Price history is kept as a shared resource: Streamlit hands every session the same
+# object instead of unpickling a fresh copy of the DataFrame on each cache hit.
+# `_timeout` is left out of the cache key (leading underscore).
+@st.cache_resource(ttl=CACHE_TTL, max_entries=MAX_CACHED_TICKERS, show_spinner=False)
+def load_price_store(ticker, period, as_of, _timeout=YAHOO_TIMEOUT):
+    """
+    Price history for a cache period wrapped in a shared IndicatorStore. The history is
+    read from the shared cache when another replica already fetched it.
+    """
+    key = cache_key("history", ticker.upper(), period, as_of)
+    history = shared_cache().get(key)
+    if history is None:
+        history = hedged_call(
+            lambda: yf.Ticker(ticker).history(period=period, timeout=YAHOO_TIMEOUT),
+            _timeout, YAHOO_HEDGE_AFTER
+        )
+        if not history.empty:
+            shared_cache().set(key, history, CACHE_TTL.total_seconds())
+    return IndicatorStore(history)
+
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot_cache():
+    """Process-wide cache of fundamentals snapshots, bounded by entries and bytes."""
+    return SnapshotCache(ttl=CACHE_TTL.total_seconds())
+
+
+def get_stock_info(ticker, as_of, timeout=YAHOO_TIMEOUT):
+    """
+    Fundamentals snapshot for a ticker for a cache period.
+    Only the fields the app reads are kept, and hits return the shared immutable snapshot
+    instead of unpickling a copy of the full ~150-key info dict. Local misses are looked up
+    in the shared cache before calling Yahoo.
+    """
+    cache = get_snapshot_cache()
+    key = (ticker.upper(), as_of)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        shared_key = cache_key("info", *key)
+        snapshot = shared_cache().get(shared_key)
+        if snapshot is None:
+            info = hedged_call(lambda: yf.Ticker(ticker).info, timeout, YAHOO_HEDGE_AFTER)
+            snapshot = FundamentalsSnapshot.from_info(info)
+            if snapshot:
+                shared_cache().set(shared_key, snapshot, CACHE_TTL.total_seconds())
+        cache.put(key, snapshot)
+    return snapshot
+
+
+@st.cache_resource(show_spinner=False)
+def get_last_good():
+    """Most recent successfully fetched (store, info, as_of) per ticker, for graceful degradation."""
+    return SnapshotCache(max_entries=MAX_CACHED_TICKERS, max_bytes=float("inf"))
+
+
+# Function to get stock data
+def get_stock_data(ticker, period="1y", deadline=None):
+    """
+    Return (history, info, store, notices) for a ticker; `info` is a FundamentalsSnapshot.
+    `history` and `store` are shared between sessions and must be treated as read-only.
+
+    Each Yahoo call is capped by YAHOO_TIMEOUT and by the deadline, if given. When a call
+    fails or runs out of time, the last good data for the ticker is served instead and a
+    message is added to `notices`. Returns Nones when there is nothing to fall back to.
+    """
+    as_of = cache_period()
+    key = (ticker.upper(), period)
+    last_good = get_last_good().get(key)
+    notices = []
+
+    def timeout():
+        return deadline.timeout(YAHOO_TIMEOUT) if deadline else YAHOO_TIMEOUT
+
+    try:
+        store = load_price_store(ticker, period, as_of, _timeout=timeout())
+    except Exception as e:
+        if last_good is None:
+            st.error(f"Error fetching data for {ticker}: {e}")
+            return None, None, None, notices
+        store = last_good[0]
+        notices.append(f"Live price data is unavailable ({describe_error(e)}); showing prices cached for {period_label(last_good[2])}.")
+
+    try:
+        info = get_stock_info(ticker, as_of, timeout=timeout())
+    except Exception as e:
+        if last_good is not None:
+            info = last_good[1]
+            notices.append(f"Fundamentals are unavailable ({describe_error(e)}); showing data cached for {period_label(last_good[2])}.")
+        else:
+            info = FundamentalsSnapshot()
+            notices.append(f"Fundamentals are unavailable ({describe_error(e)}); metrics will be incomplete.")
+
+    if not notices:
+        get_last_good().put(key, (store, info, as_of))
+    return store.frame, info, store, notices
+
+
+def period_label(as_of):
+    """Readable form of a cache_period key, e.g. "the 2024-05-03 close" or "2024-05-06 10:00"."""
+    if as_of.startswith("closed "):
+        return f"the {as_of[len('closed '):]} close"
+    return as_of
+
+
+def describe_error(error):
+    """Short description of a fetch failure for user-facing notices."""
+    if isinstance(error, DeadlineExceeded):
+        return "timed out"
+    return str(error) or type(error).__name__
+
+
+# Parallel fetches used when loading many tickers at once. Not used as a context manager,
+# so a slow symbol never blocks the caller past its timeout.
+MAX_FETCH_WORKERS = 8
+_fetch_pool = ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS, thread_name_prefix="fetch")
+
+
+def _fetch_many(fetch, tickers, timeout):
+    """Run fetch for each ticker in parallel; tickers that fail or time out map to None."""
+    tickers = list(dict.fromkeys(tickers))
+    futures = {ticker: _fetch_pool.submit(fetch, ticker) for ticker in tickers}
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for ticker, future in futures.items():
+        if future.done() and future.exception() is None:
+            results[ticker] = future.result()
+        else:
+            results[ticker] = None
+    return results
+
+
+def load_closes(tickers, period="1y", as_of=None, timeout=None):
+    """
+    Closing prices for many tickers through the shared price stores, fetched in parallel.
+    Returns {ticker: Series}; tickers that fail to load or miss the timeout map to None.
+    """
+    as_of = as_of or cache_period()
+
+    def fetch(symbol):
+        store = load_price_store(symbol, period, as_of)
+        return store.frame['Close'] if len(store) else None
+
+    return _fetch_many(fetch, tickers, timeout)
+
+
+def load_infos(tickers, as_of=None, timeout=None):
+    """
+    Info snapshots for many tickers through the info cache, fetched in parallel.
+    Returns {ticker: info}; tickers that fail to load or miss the timeout map to None.
+    """
+    as_of = as_of or cache_period()
+    return _fetch_many(lambda symbol: get_stock_info(symbol, as_of), tickers, timeout)
+
+
+def get_market_snapshot(as_of=None, timeout=None):
+    """
+    One-month performance of the major indices and sector ETFs, plus the VIX level.
+    Returns (market_data, sector_data) dicts of display strings; symbols that fail or miss
+    the timeout are reported as N/A. Complete snapshots are kept in the shared cache; partial
+    ones are not, so the missing symbols are retried on the next call.
+    """
+    as_of = as_of or cache_period()
+    key = cache_key("market", as_of)
+    cached = shared_cache().get(key)
+    if cached is not None:
+        return cached
+
+    market_data = {}
+    sector_data = {}
+    closes = load_closes(MARKET_SYMBOLS + list(SECTOR_ETFS), period="1mo", as_of=as_of, timeout=timeout)
+
+    for symbol, close in closes.items():
+        if close is None or close.empty:
+            continue
+        if symbol == "^VIX":
+            market_data[symbol] = f"{close.iloc[-1]:.2f}"
+            continue
+        perf = ((close.iloc[-1] / close.iloc[0]) - 1) * 100
+        if symbol in SECTOR_ETFS:
+            sector_data[SECTOR_ETFS[symbol]] = f"{perf:.2f}%"
+        else:
+            market_data[symbol] = f"{perf:.2f}%"
+
+    complete = len(market_data) == len(MARKET_SYMBOLS) and len(sector_data) == len(SECTOR_ETFS)
+    sector_data = {name: sector_data.get(name, "N/A") for name in SECTOR_ETFS.values()}
+    if complete:
+        shared_cache().set(key, (market_data, sector_data), CACHE_TTL.total_seconds())
+    return market_data, sector_data
+
+
+@st.cache_resource(show_spinner=False)
+def get_peer_index():
+    """Process-wide sector/industry peer index, filled as tickers are fetched."""
+    return PeerIndex()
+
+
+@st.cache_resource(show_spinner=False)
+def get_fundamentals_table():
+    """Process-wide columnar fundamentals table used by the screener."""
+    return FundamentalsTable()
+
+
+def record_snapshot(ticker, info):
+    """Register a freshly fetched info snapshot with the local indexes."""
+    if info:
+        get_peer_index().add(ticker, info)
+        get_fundamentals_table().upsert(ticker, info)
+
+
+class RequestCounter:
+    """Thread-safe count of how often each ticker, and each analysis of it, is requested."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._analyses = Counter()
+
+    def record(self, ticker, analysis=None):
+        """Count a request; `analysis` is (analysis_type, persona, structured) when known."""
+        with self._lock:
+            self._counts[ticker.upper()] += 1
+            if analysis is not None:
+                self._analyses[(ticker.upper(), *analysis)] += 1
+
+    def most_common(self, count):
+        """The `count` most requested tickers, most popular first."""
+        with self._lock:
+            return [ticker for ticker, _ in self._counts.most_common(count)]
+
+    def most_common_analyses(self, count):
+        """The `count` most requested (ticker, analysis_type, persona, structured), most popular first."""
+        with self._lock:
+            return [analysis for analysis, _ in self._analyses.most_common(count)]
+
+
+@st.cache_resource(show_spinner=False)
+def get_request_counter():
+    """Process-wide ticker request counts, used to pick tickers for cache pre-warming."""
+    return RequestCounter()
@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Overall latency budget (seconds) per analysis type
+ANALYSIS_BUDGETS = {
+    "Famous Investor Analysis": 60,
+    "Intrinsic Value Calculation": 60,
+    "Technical Analysis": 60,
+    "Elliott Wave Analysis": 75,
+    "Market Condition Analysis": 60,
+    "Portfolio Risk Analysis": 90,
+    "Stock Screener": 30,
+}
+DEFAULT_BUDGET = 60
+
+# Share of the overall budget reserved for each stage, in the order the stages run. Prompt
+# building is local work and runs inside the fetch stage's leftover time. Time a stage
+# leaves unused carries over to the stages after it.
+STAGE_SHARES = {
+    "fetch": 0.3,
+    "llm": 0.7,
+}
+
+# Yahoo calls: hard cap per attempt, and when to start a second (hedged) attempt
+YAHOO_TIMEOUT = 10
+YAHOO_HEDGE_AFTER = 3
+
+# Worker threads for timed and hedged calls. A call that times out cannot be killed, so it
+# finishes in the background; the pool is sized so a few stuck calls don't starve the rest.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="deadline")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call does not finish within its time budget."""
+
+
+class Deadline:
+    """A point in time by which work must finish, with helpers to split it across stages."""
+
+    def __init__(self, seconds):
+        self.total = seconds
+        self.expires = time.monotonic() + seconds
+
+    @classmethod
+    def for_analysis(cls, analysis_type):
+        """Deadline using the configured budget for an analysis type."""
+        return cls(ANALYSIS_BUDGETS.get(analysis_type, DEFAULT_BUDGET))
+
+    def remaining(self):
+        """Seconds left, never negative."""
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def stage(self, name):
+        """
+        Child deadline for a stage: what remains of the budget minus the shares reserved for
+        the stages after it. Create it once per run and pass it to every call in the stage.
+        """
+        stages = list(STAGE_SHARES)
+        reserved = sum(STAGE_SHARES[later] for later in stages[stages.index(name) + 1:])
+        return Deadline(max(0.0, self.remaining() - self.total * reserved))
+
+    def timeout(self, cap=None):
+        """Remaining seconds, optionally capped by a per-call limit."""
+        remaining = self.remaining()
+        return remaining if cap is None else min(remaining, cap)
+
+
+def hedged_call(fn, timeout, hedge_after, *args, **kwargs):
+    """
+    Run fn, starting a second identical attempt if the first fails or hasn't finished after
+    `hedge_after` seconds. Returns the first successful result. Raises the last error if both
+    attempts fail, or DeadlineExceeded when neither finishes within `timeout` seconds.
+    """
+    if timeout is not None and timeout <= 0:
+        raise DeadlineExceeded("No time left in the budget")
+    started = time.monotonic()
+    pending = {_executor.submit(fn, *args, **kwargs)}
+    hedged = False
+    error = None
+
+    while pending:
+        elapsed = time.monotonic() - started
+        remaining = None if timeout is None else timeout - elapsed
+        if remaining is not None and remaining <= 0:
+            break
+        wait_for = remaining
+        if not hedged:
+            until_hedge = max(0.0, hedge_after - elapsed)
+            wait_for = until_hedge if remaining is None else min(until_hedge, remaining)
+
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+
+        if not hedged and (not pending or time.monotonic() - started >= hedge_after):
+            # Failed or slow first attempt: retry, racing the new attempt against the old one
+            pending.add(_executor.submit(fn, *args, **kwargs))
+            hedged = True
+
+    if error is not None and not pending:
+        raise error
+    raise DeadlineExceeded(f"Call did not finish within {timeout:.1f}s")
@@ -0,0 +1,166 @@
+import math
+from datetime import datetime, timedelta
+
+from snapshot import numeric_value
+
+# Fundamentals compared between runs, with the labels used in delta prompts
+INFO_FIELDS = {
+    "currentPrice": "Current Price",
+    "marketCap": "Market Cap",
+    "trailingPE": "P/E Ratio",
+    "forwardPE": "Forward P/E",
+    "pegRatio": "PEG Ratio",
+    "trailingEps": "EPS",
+    "forwardEps": "Forward EPS",
+    "dividendYield": "Dividend Yield",
+    "bookValue": "Book Value",
+    "priceToBook": "Price to Book",
+    "returnOnEquity": "Return on Equity",
+    "debtToEquity": "Debt to Equity",
+    "freeCashflow": "Free Cash Flow",
+    "operatingMargins": "Operating Margin",
+    "profitMargins": "Profit Margin",
+    "revenueGrowth": "Revenue Growth",
+    "earningsGrowth": "Earnings Growth",
+    "fiftyTwoWeekLow": "52 Week Low",
+    "fiftyTwoWeekHigh": "52 Week High",
+}
+
+# Price history figures compared between runs
+HISTORY_FIELDS = {
+    "last_close": "Last Close",
+    "ma50": "50-Day MA",
+    "ma200": "200-Day MA",
+    "return_1m": "1-Month Return",
+    "return_3m": "3-Month Return",
+    "cross": "Moving Average Cross",
+}
+
+# Inputs that are already fractions (returns, margins, growth, yields); a relative threshold
+# would flag almost any move of a small fraction, so these are compared in absolute terms
+RATE_FIELDS = {
+    "dividendYield", "returnOnEquity", "operatingMargins", "profitMargins",
+    "revenueGrowth", "earningsGrowth", "return_1m", "return_3m",
+}
+
+# Suffix of market_inputs keys holding one-month index and sector moves (as fractions)
+MARKET_MOVE_SUFFIX = " 1-month change"
+
+# A numeric input counts as changed when it moves by more than this fraction of its old
+# value, or for rates by more than this many percentage points (0.02 = 2 points)
+CHANGE_THRESHOLD = 0.02
+RATE_CHANGE_THRESHOLD = 0.02
+
+# Previous analyses older than this are not updated incrementally
+MAX_DELTA_AGE = timedelta(days=30)
+
+# Characters of a previous free-text analysis passed on as its conclusions
+MAX_CONCLUSION_CHARS = 2500
+
+# Bars in one and three months of daily history
+_MONTH_BARS = 21
+
+
+def _number(value):
+    """Float value, or None for missing, non-numeric and non-finite values."""
+    value = numeric_value(value)
+    return value if value is not None and math.isfinite(value) else None
+
+
+def analysis_inputs(info, store=None):
+    """
+    The inputs an analysis depends on, as a flat JSON-serialisable dict: fundamentals from the
+    info snapshot and, with an IndicatorStore, the latest price, moving averages and returns.
+    """
+    inputs = {key: _number(info.get(key)) for key in INFO_FIELDS}
+    if store is not None and len(store):
+        close = store.close
+        inputs["last_close"] = _number(close[-1])
+        inputs["ma50"] = _number(store.moving_average(50)[-1]) if len(close) >= 50 else None
+        inputs["ma200"] = _number(store.moving_average(200)[-1]) if len(close) >= 200 else None
+        inputs["return_1m"] = _number(close[-1] / close[-_MONTH_BARS - 1] - 1) if len(close) > _MONTH_BARS else None
+        inputs["return_3m"] = _number(close[-1] / close[-3 * _MONTH_BARS - 1] - 1) if len(close) > 3 * _MONTH_BARS else None
+        inputs["cross"] = store.cross_signal() or "none"
+    return inputs
+
+
+def is_rate(key):
+    """Whether an input is a fraction compared in percentage points (see RATE_FIELDS)."""
+    return key in RATE_FIELDS or key.endswith(MARKET_MOVE_SUFFIX)
+
+
+def market_inputs(market_snapshot):
+    """
+    Inputs of a market condition analysis: the VIX level, and index and sector one-month
+    moves as fractions under "<name> 1-month change".
+    """
+    market_data, sector_data = market_snapshot
+    inputs = {}
+    for name, value in list(market_data.items()) + list(sector_data.items()):
+        key = name if name == "^VIX" else f"{name}{MARKET_MOVE_SUFFIX}"
+        try:
+            number = float(str(value).rstrip("%"))
+        except ValueError:
+            inputs[key] = None
+            continue
+        inputs[key] = number if name == "^VIX" else number / 100
+    return inputs
+
+
+def diff_inputs(previous, current, threshold=CHANGE_THRESHOLD, rate_threshold=RATE_CHANGE_THRESHOLD):
+    """
+    Inputs that changed materially between two runs, as (key, label, old, new) tuples.
+    Numbers count as changed when they move by more than `threshold` of the old value, or
+    rates (see is_rate) by more than `rate_threshold` in absolute terms; anything else when
+    it differs.
+    """
+    changes = []
+    for key, new in current.items():
+        old = previous.get(key)
+        if old is None and new is None:
+            continue
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+            limit = rate_threshold if is_rate(key) else abs(old) * threshold
+            if abs(new - old) <= limit:
+                continue
+        elif old == new:
+            continue
+        changes.append((key, INFO_FIELDS.get(key) or HISTORY_FIELDS.get(key) or key, old, new))
+    return changes
+
+
+def prior_conclusions(result):
+    """
+    What a previous analysis concluded, for a delta prompt: the summary, recommendation and
+    ranges of a structured result, or the end of a free-text one (where conclusions go).
+    """
+    if isinstance(result, dict):
+        lines = [result.get("summary") or ""]
+        if result.get("recommendation") and result["recommendation"] != "NONE":
+            lines.append(f"Recommendation: {result['recommendation']}")
+        for key, label in (("target_price_range", "Price target"), ("intrinsic_value_range", "Intrinsic value")):
+            value_range = result.get(key) or {}
+            if value_range.get("low") is not None or value_range.get("high") is not None:
+                lines.append(f"{label}: {value_range.get('low')} - {value_range.get('high')}")
+        sections = result.get("sections") or []
+        if sections:
+            lines.append(f"{sections[-1]['title']}: {sections[-1]['body']}")
+        return "\n".join(line for line in lines if line)
+
+    if len(result) <= MAX_CONCLUSION_CHARS:
+        return result
+    return "..." + result[-MAX_CONCLUSION_CHARS:]
+
+
+def delta_candidate(previous, inputs, now=None):
+    """
+    Whether an archived analysis can be updated incrementally with `inputs`: it must be a
+    full analysis (not itself an update) with stored inputs of the same kind, younger than
+    MAX_DELTA_AGE.
+    """
+    if previous is None or previous.get("delta_of") or not previous.get("inputs") or inputs is None:
+        return False
+    if set(previous["inputs"]) != set(inputs):
+        return False
+    now = now or datetime.now()
+    return now - previous["created"] <= MAX_DELTA_AGE
@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import base64
+import html
+import io
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from anthropic import APITimeoutError, AsyncAnthropic
+from dotenv import load_dotenv
+
+from cache_backend import shared_cache
+from data import MAX_FETCH_WORKERS, cache_period, get_stock_info, load_price_store
+from formatting import STATUS_COLORS, format_analysis_document, format_large_number, key_metrics
+from indicators import rolling_mean
+from llm import (
+    ANALYSIS_TOOL,
+    ANALYSIS_TOOL_NAME,
+    FAST_MODEL,
+    LLM_CACHE_TTL,
+    RETRY_TOKEN_FACTOR,
+    ROUTES,
+    IncompleteAnalysis,
+    estimate_tokens,
+    response_cache_key,
+    routing_log,
+    tool_input,
+)
+from prompts import get_intrinsic_value_prompt, get_investor_prompt
+
+# Model used for report analyses; override with --model. Batch exports favour throughput,
+# so they use the fast model rather than the interactive routing policy.
+DEFAULT_MODEL = FAST_MODEL
+
+# Routing log names for the report analysis types
+ANALYSIS_TYPES = {"investor": "Famous Investor Analysis", "intrinsic": "Intrinsic Value Calculation"}
+
+# Concurrent Claude requests; keep below the account's rate limit
+MAX_LLM_CONCURRENCY = 8
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+    body {{font-family: 'Segoe UI', Arial, sans-serif; max-width: 960px; margin: 30px auto; color: #222;}}
+    h1 {{color: #1E88E5;}}
+    h2 {{color: #0D47A1; border-bottom: 2px solid #1E88E5; padding-bottom: 5px;}}
+    table.metrics {{border-collapse: collapse; width: 100%;}}
+    table.metrics td {{border: 1px solid #ddd; padding: 8px; width: 25%;}}
+    .label {{font-size: 12px; color: #666;}}
+    .value {{font-size: 18px; font-weight: bold;}}
+    .footer {{font-size: 12px; color: #666; font-style: italic; margin-top: 30px;}}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>{summary}</p>
+<h2>Key Financial Metrics</h2>
+{metrics}
+<h2>Price History</h2>
+{chart}
+<h2>{analysis_title}</h2>
+{analysis}
+<p class="footer">Generated {generated}. Data provided by Yahoo Finance. Analysis generated by AI; not financial advice.</p>
+</body>
+</html>
+"""
+
+
+def render_chart_png(ticker, dates, closes):
+    """Price chart with 50/200-day moving averages as PNG bytes. Runs in a worker process."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    figure, axis = plt.subplots(figsize=(10, 4), dpi=100)
+    axis.plot(dates, closes, label="Price", color="#1E88E5", linewidth=1.5)
+    for window, color in ((50, "#FF9800"), (200, "#F44336")):
+        if len(closes) > window:
+            axis.plot(dates, rolling_mean(closes, window), label=f"{window}-Day MA", color=color, linewidth=1)
+    axis.set_title(f"{ticker} - 1 Year")
+    axis.grid(alpha=0.3)
+    axis.legend(loc="upper left")
+    figure.autofmt_xdate()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(figure)
+    return buffer.getvalue()
+
+
+def _metrics_table(info):
+    """Key metrics as an HTML table, four per row, colored by status."""
+    cells = []
+    for label, value, status in key_metrics(info):
+        cells.append(
+            f'<td><div class="label">{html.escape(label)}</div>'
+            f'<div class="value" style="color:{STATUS_COLORS[status]}">{html.escape(str(value))}</div></td>'
+        )
+    rows = ["<tr>" + "".join(cells[i:i + 4]) + "</tr>" for i in range(0, len(cells), 4)]
+    return '<table class="metrics">' + "".join(rows) + "</table>"
+
+
+def build_report(ticker, info, chart_png, analysis_title, analysis, output_dir, pdf=False):
+    """
+    Assemble a self-contained HTML report (chart embedded as base64) and optionally a PDF.
+    `analysis` is the response text or structured record_analysis fields.
+    Runs in a worker process. Returns the paths written.
+    """
+    chart = "<p>No price history available.</p>"
+    if chart_png:
+        encoded = base64.b64encode(chart_png).decode("ascii")
+        chart = f'<img alt="{html.escape(ticker)} price chart" style="width:100%" src="data:image/png;base64,{encoded}">'
+
+    name = info.get("longName", ticker)
+    summary = (
+        f"{html.escape(str(info.get('sector', 'N/A')))} / {html.escape(str(info.get('industry', 'N/A')))} - "
+        f"Price {format_large_number(info.get('currentPrice'))}, Market Cap {format_large_number(info.get('marketCap'))}"
+    )
+    document = REPORT_TEMPLATE.format(
+        title=html.escape(f"{name} ({ticker})"),
+        summary=summary,
+        metrics=_metrics_table(info),
+        chart=chart,
+        analysis_title=html.escape(analysis_title),
+        analysis=format_analysis_document(analysis) if analysis else "<p>Analysis unavailable.</p>",
+        generated=datetime.now().strftime("%Y-%m-%d %H:%M"),
+    )
+
+    paths = []
+    html_path = os.path.join(output_dir, f"{ticker}.html")
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(document)
+    paths.append(html_path)
+
+    if pdf:
+        # PDF output is optional and needs WeasyPrint
+        from weasyprint import HTML
+        pdf_path = os.path.join(output_dir, f"{ticker}.pdf")
+        HTML(string=document).write_pdf(pdf_path)
+        paths.append(pdf_path)
+    return paths
+
+
+def write_summary(analyses, output_dir):
+    """
+    Write summary.json with the recommendation and value ranges of each structured analysis,
+    sorted by upside of the intrinsic value midpoint over the current price. Returns the path.
+    """
+    rows = []
+    for ticker, (analysis, price) in analyses.items():
+        if not isinstance(analysis, dict):
+            continue
+        intrinsic = analysis.get("intrinsic_value_range") or {}
+        values = [v for v in (intrinsic.get("low"), intrinsic.get("high")) if v is not None]
+        upside = sum(values) / len(values) / price - 1 if values and price else None
+        rows.append({
+            "ticker": ticker,
+            "recommendation": analysis.get("recommendation"),
+            "current_price": price,
+            "target_price_range": analysis.get("target_price_range"),
+            "intrinsic_value_range": analysis.get("intrinsic_value_range"),
+            "upside": upside,
+            "summary": analysis.get("summary"),
+        })
+    rows.sort(key=lambda row: (row["upside"] is None, -(row["upside"] or 0)))
+
+    path = os.path.join(output_dir, "summary.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2)
+    return path
+
+
+def _fetch(ticker, as_of):
+    """Price history and info for one ticker through the shared data caches."""
+    try:
+        store = load_price_store(ticker, "1y", as_of)
+        info = get_stock_info(ticker, as_of)
+        return ticker, store, info
+    except Exception as e:
+        print(f"{ticker}: failed to fetch data ({e})")
+        return ticker, None, None
+
+
+def _report_prompt(analysis, ticker, info, investor):
+    """Prompt and section title for the requested analysis type."""
+    if analysis == "intrinsic":
+        return get_intrinsic_value_prompt(ticker, info), "Intrinsic Value Analysis"
+    return get_investor_prompt(investor, ticker, info), f"{investor}'s Analysis"
+
+
+async def _generate_analyses(prompts, model, concurrency, analysis_type, structured=False):
+    """
+    Run all Claude requests concurrently, at most `concurrency` at a time.
+    With `structured`, each result is the record_analysis fields instead of text.
+    Answers go through the shared cache, so prompts the app or an earlier export already
+    sent are not requested again.
+    """
+    cache = shared_cache()
+    keys = {ticker: response_cache_key(analysis_type, prompt, structured) for ticker, prompt in prompts.items()}
+    cached = {}
+    for ticker, key in keys.items():
+        entry = cache.get(key)
+        if entry is not None:
+            cached[ticker] = entry[0]
+
+    client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    semaphore = asyncio.Semaphore(concurrency)
+    max_tokens = ROUTES[analysis_type]["max_tokens"]
+    options = {}
+    if structured:
+        options = {"tools": [ANALYSIS_TOOL], "tool_choice": {"type": "tool", "name": ANALYSIS_TOOL_NAME}}
+
+    async def generate(ticker, prompt):
+        async with semaphore:
+            started = time.perf_counter()
+            record = {"analysis_type": analysis_type, "model": model, "reason": "export", "preliminary": False,
+                      "structured": structured, "prompt_tokens": estimate_tokens(prompt), "max_tokens": max_tokens,
+                      "output_tokens": None, "latency": None, "error": None, "truncated": False}
+            try:
+                # A structured answer cut off at max_tokens has partial fields; retry once with more room
+                for cap in (max_tokens, max_tokens * RETRY_TOKEN_FACTOR) if structured else (max_tokens,):
+                    message = await client.messages.create(
+                        model=model,
+                        max_tokens=cap,
+                        messages=[{"role": "user", "content": prompt}],
+                        **options
+                    )
+                    if message.stop_reason != "max_tokens":
+                        break
+                truncated = message.stop_reason == "max_tokens"
+                record.update(latency=time.perf_counter() - started, prompt_tokens=message.usage.input_tokens,
+                              output_tokens=message.usage.output_tokens, max_tokens=cap, truncated=truncated)
+                if structured and truncated:
+                    raise IncompleteAnalysis(f"The structured analysis was cut off at {cap} output tokens")
+                result = tool_input(message) if structured else message.content[0].text
+                # Cut-off text is still reported, but not reused
+                if not truncated:
+                    cache.set(keys[ticker], (result, record), LLM_CACHE_TTL)
+                return ticker, result
+            except Exception as e:
+                if isinstance(e, APITimeoutError):
+                    record["error"] = "timeout"
+                elif isinstance(e, IncompleteAnalysis):
+                    record["error"] = "truncated"
+                else:
+                    record["error"] = type(e).__name__
+                print(f"{ticker}: analysis failed ({e})")
+                return ticker, None
+            finally:
+                routing_log.record(**record)
+
+    results = await asyncio.gather(*(generate(t, p) for t, p in prompts.items() if t not in cached))
+    return {**cached, **dict(results)}
+
+
+def export_reports(tickers, output_dir, analysis="investor", investor="Warren Buffett",
+                   model=DEFAULT_MODEL, pdf=False, processes=None, concurrency=MAX_LLM_CONCURRENCY,
+                   structured=False):
+    """
+    Produce a report per ticker in `output_dir`.
+
+    Data is fetched on a thread pool, charts render on a process pool while the Claude
+    requests run on an async pool, and documents are assembled on the process pool.
+    With `structured`, analyses are requested as fields and summary.json ranks the watchlist.
+    Returns {ticker: [paths]}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    as_of = cache_period()
+
+    with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+        fetched = [r for r in executor.map(lambda t: _fetch(t, as_of), tickers) if r[2]]
+
+    written = {}
+    # Spawn rather than fork: the fetch and deadline thread pools are live by now, possibly
+    # with threads stuck in timed-out Yahoo calls, and forking them can deadlock the workers
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Charts render in the background while the LLM calls are in flight
+        charts = {
+            ticker: pool.submit(render_chart_png, ticker, store.index.to_pydatetime(), store.close.copy())
+            for ticker, store, info in fetched if len(store)
+        }
+
+        prompts = {}
+        titles = {}
+        for ticker, store, info in fetched:
+            prompts[ticker], titles[ticker] = _report_prompt(analysis, ticker, info, investor)
+        analyses = asyncio.run(_generate_analyses(prompts, model, concurrency, ANALYSIS_TYPES[analysis], structured))
+
+        documents = {}
+        for ticker, store, info in fetched:
+            chart_png = None
+            if ticker in charts:
+                try:
+                    chart_png = charts[ticker].result()
+                except Exception as e:
+                    print(f"{ticker}: failed to render chart ({e})")
+            documents[ticker] = pool.submit(
+                build_report, ticker, info, chart_png, titles[ticker], analyses.get(ticker), output_dir, pdf
+            )
+        for ticker, future in documents.items():
+            try:
+                written[ticker] = future.result()
+            except Exception as e:
+                print(f"{ticker}: failed to build report ({e})")
+
+    if structured:
+        write_summary({ticker: (analyses.get(ticker), info.get("currentPrice")) for ticker, store, info in fetched},
+                      output_dir)
+    return written
+
+
+def main():
+    """Command line entry point: export reports for a watchlist."""
+    parser = argparse.ArgumentParser(description="Export HTML/PDF analysis reports for a watchlist")
+    parser.add_argument("tickers", nargs="+", help="Ticker symbols")
+    parser.add_argument("--out", default="reports", help="Output directory (default: reports)")
+    parser.add_argument("--analysis", choices=["investor", "intrinsic"], default="investor")
+    parser.add_argument("--investor", default="Warren Buffett", help="Investor style for investor analyses")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--pdf", action="store_true", help="Also write PDFs (requires weasyprint)")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes for rendering")
+    parser.add_argument("--concurrency", type=int, default=MAX_LLM_CONCURRENCY, help="Concurrent Claude requests")
+    parser.add_argument("--structured", action="store_true", help="Request structured analyses and write summary.json")
+    args = parser.parse_args()
+
+    load_dotenv()
+    started = time.perf_counter()
+    written = export_reports(args.tickers, args.out, args.analysis, args.investor,
+                             args.model, args.pdf, args.processes, args.concurrency, args.structured)
+    print(f"Wrote {len(written)} reports to {args.out} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+import html
+import re
+
+# Helper function to determine metric status (positive, neutral, negative)
+def get_metric_status(metric_name, value):
+    """
+    Determine if a metric is positive, neutral, or negative based on generally accepted standards.
+    Returns: "positive", "neutral", or "negative"
+    """
+    if value is None or value == 'N/A':
+        return "neutral"
+    
+    try:
+        value = float(value) if isinstance(value, str) and value.replace('.', '', 1).isdigit() else value
+        
+        # Valuation metrics - lower is generally better
+        if metric_name in ["P/E Ratio", "Forward P/E", "Price to Book"]:
+            if isinstance(value, (int, float)):
+                if metric_name == "P/E Ratio" or metric_name == "Forward P/E":
+                    if value < 15:
+                        return "positive"
+                    elif value < 25:
+                        return "neutral"
+                    else:
+                        return "negative"
+                elif metric_name == "Price to Book":
+                    if value < 1.5:
+                        return "positive"
+                    elif value < 3:
+                        return "neutral"
+                    else:
+                        return "negative"
+        
+        # Growth metrics - higher is generally better
+        elif metric_name in ["Revenue Growth", "Earnings Growth", "Dividend Yield", "Return on Equity"]:
+            if isinstance(value, (int, float)):
+                if metric_name == "Dividend Yield":
+                    if value > 0.03:  # > 3%
+                        return "positive"
+                    elif value > 0.01:  # > 1%
+                        return "neutral"
+                    elif value > 0:
+                        return "neutral"
+                    else:
+                        return "neutral"  # No dividend isn't necessarily bad
+                elif metric_name in ["Revenue Growth", "Earnings Growth"]:
+                    if value > 0.15:  # > 15%
+                        return "positive"
+                    elif value > 0.05:  # > 5%
+                        return "neutral"
+                    elif value > 0:
+                        return "neutral"
+                    else:
+                        return "negative"
+                elif metric_name == "Return on Equity":
+                    if value > 0.15:  # > 15%
+                        return "positive"
+                    elif value > 0.10:  # > 10%
+                        return "neutral"
+                    elif value > 0:
+                        return "neutral"
+                    else:
+                        return "negative"
+        
+        # Financial health metrics
+        elif metric_name == "Debt to Equity":
+            if isinstance(value, (int, float)):
+                if value < 0.5:
+                    return "positive"
+                elif value < 1.5:
+                    return "neutral"
+                else:
+                    return "negative"
+        
+        # Margin metrics
+        elif metric_name in ["Operating Margin", "Profit Margin"]:
+            if isinstance(value, (int, float)):
+                if value > 0.20:  # > 20%
+                    return "positive"
+                elif value > 0.10:  # > 10%
+                    return "neutral"
+                elif value > 0:
+                    return "neutral"
+                else:
+                    return "negative"
+        
+        # PEG Ratio
+        elif metric_name == "PEG Ratio":
+            if isinstance(value, (int, float)):
+                if value < 1:
+                    return "positive"
+                elif value < 2:
+                    return "neutral"
+                else:
+                    return "negative"
+    
+    except (ValueError, TypeError):
+        return "neutral"
+    
+    # Default case
+    return "neutral"
+
+# Badge colors for buy/hold/sell recommendations
+RECOMMENDATION_COLORS = {"BUY": "#4CAF50", "HOLD": "#FF9800", "SELL": "#F44336"}
+
+SECTION_HEADER_STYLE = "color:#1E88E5; font-size:22px; font-weight:bold; border-bottom:2px solid #1E88E5; margin-top:25px; margin-bottom:15px; padding-bottom:5px;"
+
+STATUS_COLORS = {"positive": "#4CAF50", "negative": "#F44336", "neutral": "#888"}
+
+# Helper function to render a recommendation badge
+def recommendation_badge(recommendation):
+    """Color-coded BUY/HOLD/SELL badge, or an empty string for anything else."""
+    recommendation = (recommendation or "").upper()
+    color = RECOMMENDATION_COLORS.get(recommendation)
+    if color is None:
+        return ""
+    return f'<span style="background-color:{color}; color:white; padding:3px 8px; border-radius:4px; font-weight:bold; text-transform:uppercase;">{recommendation}</span>'
+
+# Helper function to enhance visual hierarchy of AI responses
+def format_ai_response(text):
+    """
+    Enhance the formatting of AI responses to improve visual hierarchy.
+    - Identifies and styles section headers
+    - Applies highlighting to key insights
+    - Formats lists better
+    """
+    # Find common section headers in investor analyses (like "Initial impression", "Business quality analysis", etc.)
+    enhanced_text = text
+    
+    # Convert section headers to styled headers with a color accent
+    # This pattern matches common section headers from the prompts
+    section_headers = [
+        "Initial impression", "Business quality analysis", "Management assessment", 
+        "Financial strength", "Valuation", "Risks and concerns", "Conclusion",
+        "Stock category", "The company's story", "Growth analysis and PEG ratio",
+        "Competitive position", "Potential catalysts", "Red flags or concerns",
+        "Macroeconomic positioning", "Debt and balance sheet analysis",
+        "Correlation with economic indicators", "Portfolio fit",
+        "Innovation category", "Addressable market analysis", "Growth metrics",
+        "What changed", "Impact on the analysis", "Updated conclusion"
+    ]
+    
+    # Create a regex pattern that matches these headers (with or without colon)
+    headers_pattern = "|".join(section_headers)
+    section_pattern = rf'(^|\n)[ \t]*(?:\*\*)?(({headers_pattern})(:)?)(?:\*\*)?[ \t]*(\n|$)'
+    
+    # Replace with styled headers
+    enhanced_text = re.sub(
+        section_pattern, 
+        rf'\1<div style="{SECTION_HEADER_STYLE}">\2</div>', 
+        enhanced_text,
+        flags=re.IGNORECASE
+    )
+    
+    # Second pattern for other capitalized headers with colons
+    general_section_pattern = r'(^|\n)[ \t]*([A-Z][A-Za-z\s]+:)[ \t]*(\n|$)'
+    enhanced_text = re.sub(
+        general_section_pattern, 
+        r'\1<div style="color:#1E88E5; font-size:20px; font-weight:bold; margin-top:20px; margin-bottom:10px;">\2</div>', 
+        enhanced_text
+    )
+    
+    # Add emphasis to subsections (often marked with bold)
+    subsection_pattern = r'\*\*(.*?)\*\*:'
+    enhanced_text = re.sub(
+        subsection_pattern, 
+        r'<span style="color:#0D47A1; font-weight:bold; font-size:18px;">\1:</span>', 
+        enhanced_text
+    )
+    
+    # Highlight important metrics/numbers
+    metrics_pattern = r'([0-9]+(\.[0-9]+)?\s*%)|(\$[0-9]+(,[0-9]+)*(\.[0-9]+)?[KMBT]?)'
+    enhanced_text = re.sub(
+        metrics_pattern, 
+        r'<span style="color:#FF5722; font-weight:bold;">\g<0></span>', 
+        enhanced_text
+    )
+    
+    # Highlight buy/hold/sell recommendations with color-coded badges
+    def recommendation_replacement(match):
+        return recommendation_badge(match.group(1)) or match.group(0)
+    
+    recommendation_pattern = r'\b(buy|hold|sell)\b'
+    enhanced_text = re.sub(recommendation_pattern, recommendation_replacement, enhanced_text, flags=re.IGNORECASE)
+    
+    # Enhance bullet points to make them more visible
+    enhanced_text = enhanced_text.replace('- ', '• ')
+    
+    # Add paragraph spacing for better readability
+    enhanced_text = re.sub(r'(\n\n|\r\n\r\n)', r'<div style="margin-bottom:15px;"></div>', enhanced_text)
+    
+    # Final wrap with better spacing and font, but WITHOUT a background color
+    enhanced_text = f'''
+    <div style="line-height:1.6; font-size:16px; font-family: 'Segoe UI', Arial, sans-serif; padding:15px; border-radius:5px;">
+        {enhanced_text}
+    </div>
+    '''
+    
+    return enhanced_text
+
+# Helper function to render a structured (tool use) analysis
+def format_structured_analysis(analysis, render_text=None):
+    """
+    Render the fields of a record_analysis result as HTML: recommendation and value ranges,
+    summary, key metrics and sections. No pattern matching over the text is needed.
+    Section bodies are left as Markdown for st.markdown unless `render_text` converts them.
+    """
+    parts = []
+    
+    badges = []
+    badge = recommendation_badge(analysis.get('recommendation'))
+    if badge:
+        badges.append(f"Recommendation: {badge}")
+    for key, label in (("target_price_range", "Price Target"), ("intrinsic_value_range", "Intrinsic Value")):
+        value_range = format_value_range(analysis.get(key))
+        if value_range:
+            badges.append(f"{label}: <b>{value_range}</b>")
+    if badges:
+        parts.append(f'<div style="margin-bottom:15px;">{" &nbsp;|&nbsp; ".join(badges)}</div>')
+    
+    if analysis.get('summary'):
+        parts.append(f'<div style="font-size:17px; margin-bottom:15px;">{html.escape(analysis["summary"])}</div>')
+    
+    metrics = analysis.get('key_metrics') or []
+    if metrics:
+        rows = []
+        for metric in metrics:
+            color = STATUS_COLORS.get(metric.get('assessment'), STATUS_COLORS['neutral'])
+            rows.append(
+                f'<tr><td style="padding:4px 10px;">{html.escape(metric.get("name", ""))}</td>'
+                f'<td style="padding:4px 10px; color:{color}; font-weight:bold;">{html.escape(str(metric.get("value", "")))}</td>'
+                f'<td style="padding:4px 10px;">{html.escape(metric.get("comment", ""))}</td></tr>'
+            )
+        parts.append(f'<table style="margin-bottom:15px;">{"".join(rows)}</table>')
+    
+    for section in analysis.get('sections') or []:
+        parts.append(f'<div style="{SECTION_HEADER_STYLE}">{html.escape(section.get("title", ""))}</div>')
+        body = section.get("body", "")
+        parts.append(render_text(body) if render_text else f'\n\n{body}\n\n')
+    
+    return f'''
+    <div style="line-height:1.6; font-size:16px; font-family: 'Segoe UI', Arial, sans-serif; padding:15px; border-radius:5px;">
+        {"".join(parts)}
+    </div>
+    '''
+
+# Helper function to render either kind of analysis result
+def format_analysis(result):
+    """HTML for a response text or structured record_analysis fields."""
+    if isinstance(result, dict):
+        return format_structured_analysis(result)
+    return format_ai_response(result)
+
+# Helper function to turn model-written Markdown into HTML outside Streamlit
+def markdown_to_html(text):
+    """
+    Escape model text and convert its Markdown to HTML, for documents that are not rendered
+    by st.markdown. Falls back to plain paragraphs when the markdown package is missing.
+    """
+    escaped = html.escape(text, quote=False)
+    try:
+        import markdown
+    except ImportError:
+        paragraphs = [p.strip() for p in re.split(r'\n\s*\n', escaped) if p.strip()]
+        return "".join("<p>" + p.replace("\n", "<br>") + "</p>" for p in paragraphs)
+    return markdown.markdown(escaped, extensions=["sane_lists"])
+
+# Helper function to render either kind of analysis result as a standalone document
+def format_analysis_document(result):
+    """HTML for a response text or structured record_analysis fields, with Markdown converted."""
+    if isinstance(result, dict):
+        return format_structured_analysis(result, render_text=markdown_to_html)
+    return markdown_to_html(result)
+
+# Helper function to format a low-high value range
+def format_value_range(value_range):
+    """Format a {low, high} range in dollars, or None when neither end is given."""
+    if not value_range:
+        return None
+    low, high = value_range.get('low'), value_range.get('high')
+    if low is None and high is None:
+        return None
+    if low is None or high is None or low == high:
+        return format_large_number(low if high is None else high)
+    return f"{format_large_number(low)} - {format_large_number(high)}"
+
+# Helper function to format large numbers
+def format_large_number(num):
+    """Format large numbers with K, M, B suffixes."""
+    if num is None or num == 'N/A':
+        return 'N/A'
+    
+    try:
+        num = float(num)
+        if num >= 1_000_000_000:
+            return f"${num/1_000_000_000:.2f}B"
+        elif num >= 1_000_000:
+            return f"${num/1_000_000:.2f}M"
+        elif num >= 1_000:
+            return f"${num/1_000:.2f}K"
+        else:
+            return f"${num:.2f}"
+    except:
+        return str(num)
+
+# Helper function to format percentages
+def format_percentage(num):
+    """Format a decimal as a percentage."""
+    if num is None or num == 'N/A':
+        return 'N/A'
+    
+    try:
+        num = float(num)
+        return f"{num*100:.2f}%"
+    except:
+        return str(num)
+
+# Metrics shown in the key financial metrics grid: (label, info key, formatter, fixed status)
+KEY_METRICS = [
+    ("P/E Ratio", "trailingPE", "ratio", None),
+    ("Forward P/E", "forwardPE", "ratio", None),
+    ("PEG Ratio", "pegRatio", "ratio", None),
+    ("EPS", "trailingEps", "dollars", None),
+    ("Dividend Yield", "dividendYield", "percent", None),
+    ("Book Value", "bookValue", "dollars", "neutral"),
+    ("Price to Book", "priceToBook", "ratio", None),
+    ("Return on Equity", "returnOnEquity", "percent", None),
+    ("Debt to Equity", "debtToEquity", "ratio", None),
+    ("Free Cash Flow", "freeCashflow", "large", "neutral"),
+    ("Operating Margin", "operatingMargins", "percent", None),
+    ("Profit Margin", "profitMargins", "percent", None),
+]
+
+def key_metrics(info):
+    """
+    Key financial metrics for a ticker as (label, formatted value, status) tuples.
+    Status is judged on the raw value, so percentages are rated as well as ratios.
+    """
+    rows = []
+    for label, key, kind, fixed_status in KEY_METRICS:
+        raw = info.get(key)
+        if raw in ['N/A', None]:
+            value = 'N/A'
+        elif kind == "ratio":
+            value = round(raw, 2) if isinstance(raw, (int, float)) else raw
+        elif kind == "dollars":
+            value = f"${raw}"
+        elif kind == "percent":
+            value = format_percentage(raw)
+        else:
+            value = format_large_number(raw)
+        rows.append((label, value, fixed_status or get_metric_status(label, raw)))
+    return rows
@@ -0,0 +1,269 @@
+import ast
+import threading
+
+import numpy as np
+import pandas as pd
+
+from snapshot import numeric_value
+
+# Screenable numeric columns and the yfinance info field each one is read from
+NUMERIC_COLUMNS = {
+    "price": "currentPrice",
+    "market_cap": "marketCap",
+    "pe": "trailingPE",
+    "forward_pe": "forwardPE",
+    "peg": "pegRatio",
+    "eps": "trailingEps",
+    "dividend_yield": "dividendYield",
+    "book_value": "bookValue",
+    "pb": "priceToBook",
+    "roe": "returnOnEquity",
+    "debt_to_equity": "debtToEquity",
+    "fcf": "freeCashflow",
+    "operating_margin": "operatingMargins",
+    "profit_margin": "profitMargins",
+    "revenue_growth": "revenueGrowth",
+    "earnings_growth": "earningsGrowth",
+    "beta": "beta",
+}
+
+# Screenable text columns
+TEXT_COLUMNS = {
+    "sector": "sector",
+    "industry": "industry",
+    "country": "country",
+    "name": "longName",
+}
+
+_COMPARISONS = {
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+    ast.In: "in",
+    ast.NotIn: "not in",
+}
+
+
+class QueryError(ValueError):
+    """Raised for screening queries that cannot be parsed or reference unknown columns."""
+
+
+class FundamentalsTable:
+    """
+    Columnar table of fundamentals with sorted indexes for fast screening.
+
+    Each metric is one typed NumPy column. Numeric columns keep an argsort index so range
+    conditions (pe < 15) are answered with a binary search; text columns keep an inverted
+    index so equality conditions (sector == 'Technology') are a dictionary lookup. Snapshots
+    can be added at any time; the columns and indexes are rebuilt lazily on the next query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._dirty = True
+        self._tickers = np.empty(0, dtype=object)
+        self._numeric = {}
+        self._sorted = {}
+        self._text = {}
+        self._inverted = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def upsert(self, ticker, info):
+        """Add or replace a ticker's fundamentals from its info snapshot."""
+        # Missing values are None here and become NaN when the columns are built
+        row = {column: numeric_value(info.get(key)) for column, key in NUMERIC_COLUMNS.items()}
+        row.update({column: info.get(key) or "" for column, key in TEXT_COLUMNS.items()})
+        with self._lock:
+            self._rows[ticker.upper()] = row
+            self._dirty = True
+
+    def query(self, expression, order_by=None, ascending=True, limit=None):
+        """
+        Screen with an expression such as "pe < 15 and roe > 0.15 and sector == 'Technology'".
+
+        Supports <, <=, >, >=, ==, !=, chained ranges (10 < pe < 20), `in`/`not in` lists,
+        column-to-column comparisons, and/or/not and parentheses. Returns a DataFrame of the
+        matching tickers. Raises QueryError for invalid expressions.
+        """
+        try:
+            tree = ast.parse(expression, mode="eval").body
+        except SyntaxError as e:
+            raise QueryError(f"Invalid query: {e.msg}")
+
+        with self._lock:
+            self._build()
+            mask = self._evaluate(tree)
+            rows = np.flatnonzero(mask)
+            frame = self._frame(rows)
+
+        if order_by:
+            if order_by not in frame.columns:
+                raise QueryError(f"Unknown column: {order_by}")
+            frame = frame.sort_values(order_by, ascending=ascending, na_position="last")
+        if limit:
+            frame = frame.head(limit)
+        return frame
+
+    def _frame(self, rows):
+        """DataFrame for the given row positions. Caller holds the lock."""
+        data = {column: self._text[column][rows] for column in TEXT_COLUMNS}
+        data.update({column: self._numeric[column][rows] for column in NUMERIC_COLUMNS})
+        return pd.DataFrame(data, index=pd.Index(self._tickers[rows], name="ticker"))
+
+    def _build(self):
+        """Rebuild columns and indexes after snapshots changed. Caller holds the lock."""
+        if not self._dirty:
+            return
+
+        tickers = sorted(self._rows)
+        rows = [self._rows[t] for t in tickers]
+        self._tickers = np.array(tickers, dtype=object)
+
+        for column in NUMERIC_COLUMNS:
+            values = np.array([row[column] for row in rows], dtype=float)
+            # argsort puts NaN last, so searches over the sorted values never see them
+            order = np.argsort(values, kind="stable")
+            present = int((~np.isnan(values)).sum())
+            self._numeric[column] = values
+            self._sorted[column] = (values[order[:present]], order[:present])
+
+        for column in TEXT_COLUMNS:
+            values = np.array([row[column] for row in rows], dtype=object)
+            inverted = {}
+            for position, value in enumerate(values):
+                inverted.setdefault(value.lower(), []).append(position)
+            self._text[column] = values
+            self._inverted[column] = {value: np.array(positions) for value, positions in inverted.items()}
+
+        self._dirty = False
+
+    def _evaluate(self, node):
+        """Boolean row mask for an expression node. Caller holds the lock."""
+        if isinstance(node, ast.BoolOp):
+            masks = [self._evaluate(value) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return combine.reduce(masks)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return ~self._evaluate(node.operand)
+        if isinstance(node, ast.Compare):
+            # Chained comparisons (10 < pe < 20) are a conjunction of pairs
+            mask = np.ones(len(self._tickers), dtype=bool)
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                if type(op) not in _COMPARISONS:
+                    raise QueryError("Unsupported comparison operator")
+                mask &= self._compare(left, _COMPARISONS[type(op)], right)
+                left = right
+            return mask
+        raise QueryError("Queries must be comparisons joined with and/or/not")
+
+    def _compare(self, left, op, right):
+        """Mask for a single comparison between a column and a constant or another column."""
+        left_column = self._column_name(left)
+        right_column = self._column_name(right)
+
+        if left_column and right_column:
+            a, b = self._column_values(left_column), self._column_values(right_column)
+            return self._apply(a, op, b)
+        if right_column and not left_column:
+            # Normalise "15 > pe" to "pe < 15"
+            flipped = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "==": "==", "!=": "!="}
+            if op not in flipped:
+                raise QueryError("`in` needs a column on the left")
+            left, right, left_column, op = right, left, right_column, flipped[op]
+        if not left_column:
+            raise QueryError("Each comparison needs a column name")
+
+        value = self._constant(right)
+        if left_column in NUMERIC_COLUMNS:
+            return self._numeric_compare(left_column, op, value)
+        return self._text_compare(left_column, op, value)
+
+    def _numeric_compare(self, column, op, value):
+        """Range or equality lookup on a numeric column using its sorted index."""
+        mask = np.zeros(len(self._tickers), dtype=bool)
+        ordered, order = self._sorted[column]
+
+        if op in ("in", "not in"):
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for item in values:
+                mask |= self._numeric_compare(column, "==", item)
+            if op == "not in":
+                mask = ~mask & ~np.isnan(self._numeric[column])
+            return mask
+
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise QueryError(f"{column} must be compared with a number")
+
+        if op == "!=":
+            return ~self._numeric_compare(column, "==", value) & ~np.isnan(self._numeric[column])
+
+        bounds = {
+            "<": (0, np.searchsorted(ordered, value, side="left")),
+            "<=": (0, np.searchsorted(ordered, value, side="right")),
+            ">": (np.searchsorted(ordered, value, side="right"), len(ordered)),
+            ">=": (np.searchsorted(ordered, value, side="left"), len(ordered)),
+            "==": (np.searchsorted(ordered, value, side="left"), np.searchsorted(ordered, value, side="right")),
+        }
+        start, stop = bounds[op]
+        mask[order[start:stop]] = True
+        return mask
+
+    def _text_compare(self, column, op, value):
+        """Case-insensitive equality and membership on a text column via its inverted index."""
+        mask = np.zeros(len(self._tickers), dtype=bool)
+        values = value if isinstance(value, (list, tuple)) else [value]
+        if op not in ("==", "!=", "in", "not in"):
+            raise QueryError(f"{column} only supports ==, !=, in and not in")
+        for item in values:
+            if not isinstance(item, str):
+                raise QueryError(f"{column} must be compared with text")
+            positions = self._inverted[column].get(item.lower())
+            if positions is not None:
+                mask[positions] = True
+        return ~mask if op in ("!=", "not in") else mask
+
+    def _apply(self, a, op, b):
+        """Element-wise comparison between two columns."""
+        with np.errstate(invalid="ignore"):
+            if op == "<":
+                return a < b
+            if op == "<=":
+                return a <= b
+            if op == ">":
+                return a > b
+            if op == ">=":
+                return a >= b
+            if op == "==":
+                return a == b
+            if op == "!=":
+                return a != b
+        raise QueryError("`in` cannot compare two columns")
+
+    def _column_values(self, column):
+        if column in NUMERIC_COLUMNS:
+            return self._numeric[column]
+        return np.array([value.lower() for value in self._text[column]], dtype=object)
+
+    @staticmethod
+    def _column_name(node):
+        """Column name referenced by a node, or None for constants. Raises for unknown names."""
+        if not isinstance(node, ast.Name):
+            return None
+        if node.id not in NUMERIC_COLUMNS and node.id not in TEXT_COLUMNS:
+            raise QueryError(f"Unknown column: {node.id}")
+        return node.id
+
+    @staticmethod
+    def _constant(node):
+        """Literal value of a constant, negative number or list/tuple of constants."""
+        try:
+            return ast.literal_eval(node)
+        except ValueError:
+            raise QueryError("Comparisons must use literal numbers or quoted text")
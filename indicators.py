@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+
+# Moving average windows shown on the price chart
+DEFAULT_WINDOWS = (50, 200)
+
+
+def rolling_mean(values, window):
+    """
+    Simple moving average computed with a single cumulative sum.
+    Works on 1-D series or 2-D (bars x tickers) arrays. A value is produced only when the
+    whole window holds data, matching pandas' rolling(window).mean(), so series that start
+    later (leading NaNs) in a universe matrix are handled correctly.
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(values.shape, np.nan)
+    if window <= 0 or len(values) < window:
+        return result
+
+    present = ~np.isnan(values)
+    csum = np.cumsum(np.where(present, values, 0.0), axis=0)
+    ccount = np.cumsum(present, axis=0)
+
+    sums = csum[window - 1:].copy()
+    counts = ccount[window - 1:].copy()
+    sums[1:] -= csum[:-window]
+    counts[1:] -= ccount[:-window]
+
+    full = counts == window
+    result[window - 1:][full] = sums[full] / window
+    return result
+
+
+def detect_cross(ma_fast, ma_slow, lookback=20):
+    """
+    Detect a recent golden or death cross between two moving averages.
+    Returns "golden", "death" or None, comparing the latest bar against `lookback` bars ago.
+    """
+    if len(ma_fast) < lookback or len(ma_slow) < lookback:
+        return None
+
+    if ma_fast[-1] > ma_slow[-1] and ma_fast[-lookback] <= ma_slow[-lookback]:
+        return "golden"
+    elif ma_fast[-1] < ma_slow[-1] and ma_fast[-lookback] >= ma_slow[-lookback]:
+        return "death"
+    return None
+
+
+def by_trading_date(series):
+    """A price series indexed by naive calendar date, keeping the last bar of each day."""
+    series = series.copy()
+    # yfinance timestamps carry exchange time zones, so the same day differs across exchanges
+    series.index = pd.DatetimeIndex(series.index).tz_localize(None).normalize()
+    return series[~series.index.duplicated(keep="last")]
+
+
+def _read_only(array):
+    """Return a view of the array that cannot be written through."""
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class IndicatorStore:
+    """
+    Read-only closing prices plus incrementally maintained moving averages.
+
+    The store is meant to be shared between sessions (via st.cache_resource), so every
+    array it hands out is a read-only view. New bars are appended in place: each moving
+    average is extended from its running window sum instead of recomputing the whole window.
+    """
+
+    def __init__(self, history, windows=DEFAULT_WINDOWS):
+        closes = history['Close'].to_numpy(dtype=float) if not history.empty else np.empty(0)
+        self.frame = history
+        self.windows = tuple(windows)
+
+        # Buffers grow geometrically so appends are amortised O(1)
+        capacity = max(len(closes) * 2, 64)
+        self._size = len(closes)
+        self._index = history.index
+        self._close = np.empty(capacity)
+        self._close[:self._size] = closes
+        self._ma = {}
+        # Running sum of the present closes in each trailing window, and how many are missing;
+        # a window with a missing close has no average, as in rolling_mean
+        self._window_sums = {}
+        self._window_gaps = {}
+        for window in self.windows:
+            self._ma[window] = np.empty(capacity)
+            self._ma[window][:self._size] = rolling_mean(closes, window)
+            tail = closes[-window:]
+            self._window_sums[window] = np.nansum(tail)
+            self._window_gaps[window] = int(np.isnan(tail).sum())
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def index(self):
+        """Timestamps for every bar in the store."""
+        return self._index
+
+    @property
+    def close(self):
+        """Closing prices as a read-only array."""
+        return _read_only(self._close[:self._size])
+
+    def moving_average(self, window):
+        """Moving average for one of the configured windows, as a read-only array."""
+        return _read_only(self._ma[window][:self._size])
+
+    @property
+    def last_timestamp(self):
+        """Timestamp of the most recent bar, or None when the store is empty."""
+        return self._index[-1] if self._size else None
+
+    def cross_signal(self, fast=50, slow=200, lookback=20):
+        """Golden/death cross state of the latest bars (see detect_cross)."""
+        if self._size <= slow:
+            return None
+        return detect_cross(self.moving_average(fast), self.moving_average(slow), lookback)
+
+    def append(self, bars):
+        """
+        Append new bars (a DataFrame with a 'Close' column) and extend the moving averages.
+        A bar with the same timestamp as the last stored one replaces it, so an in-progress
+        bar gets its final close; older bars are ignored. Returns the number of bars written.
+        """
+        if bars is None or bars.empty:
+            return 0
+        written = 0
+        if self._size:
+            last = bars[bars.index == self._index[-1]]
+            if not last.empty:
+                self._replace_last(float(last['Close'].iloc[-1]))
+                written += 1
+            bars = bars[bars.index > self._index[-1]]
+            if bars.empty:
+                return written
+
+        new_closes = bars['Close'].to_numpy(dtype=float)
+        self._reserve(self._size + len(new_closes))
+
+        for price in new_closes:
+            position = self._size
+            self._close[position] = price
+            for window in self.windows:
+                # Slide the running window sum forward by one bar
+                self._add(window, price, 1)
+                if position >= window:
+                    self._add(window, self._close[position - window], -1)
+                self._ma[window][position] = self._average(window, position)
+            self._size += 1
+
+        self._index = self._index.append(bars.index)
+        return written + len(new_closes)
+
+    def _replace_last(self, price):
+        """Swap the close of the latest bar and update the windows that end on it."""
+        position = self._size - 1
+        previous = self._close[position]
+        self._close[position] = price
+        for window in self.windows:
+            self._add(window, previous, -1)
+            self._add(window, price, 1)
+            self._ma[window][position] = self._average(window, position)
+
+    def _add(self, window, price, sign):
+        """Add (sign=1) or remove (sign=-1) one close from a window's running sum."""
+        if np.isnan(price):
+            self._window_gaps[window] += sign
+        else:
+            self._window_sums[window] += sign * price
+
+    def _average(self, window, position):
+        """Moving average ending at `position` from the running sum, NaN if the window is short or has gaps."""
+        if position < window - 1 or self._window_gaps[window]:
+            return np.nan
+        return self._window_sums[window] / window
+
+    def _reserve(self, needed):
+        """Grow the backing buffers so they can hold `needed` bars."""
+        if needed <= len(self._close):
+            return
+        capacity = max(needed, len(self._close) * 2)
+        grown = np.empty(capacity)
+        grown[:self._size] = self._close[:self._size]
+        self._close = grown
+        for window in self.windows:
+            grown = np.empty(capacity)
+            grown[:self._size] = self._ma[window][:self._size]
+            self._ma[window] = grown
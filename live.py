@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+import numpy as np
+import yfinance as yf
+
+from indicators import IndicatorStore
+
+# Intraday bar size and how much history seeds the moving averages (5 days of 1m bars ~ 1950 bars)
+LIVE_INTERVAL = "1m"
+LIVE_SEED_PERIOD = "5d"
+
+# Seconds between polls while the market is open
+LIVE_POLL_SECONDS = 60
+
+# Moving average windows, in bars
+LIVE_FAST = 50
+LIVE_SLOW = 200
+
+# Bars shown on the live chart and alerts kept per session
+LIVE_CHART_BARS = 390
+MAX_ALERTS = 20
+
+
+def fetch_bars_since(ticker, since=None, interval=LIVE_INTERVAL):
+    """
+    Intraday bars for a ticker. With `since`, only bars from that timestamp on are requested,
+    so each poll downloads a handful of rows instead of the whole session.
+    """
+    stock = yf.Ticker(ticker)
+    if since is None:
+        return stock.history(period=LIVE_SEED_PERIOD, interval=interval)
+    # yfinance's start is inclusive; the store replaces the bar it already has
+    return stock.history(start=since - timedelta(minutes=1), interval=interval)
+
+
+def new_crosses(store, count, fast=LIVE_FAST, slow=LIVE_SLOW):
+    """
+    Golden/death crosses among the last `count` written bars, as (timestamp, "golden"|"death").
+    Only those bars (plus the one before them) are examined.
+    """
+    if count <= 0 or len(store) <= slow:
+        return []
+
+    span = min(count + 1, len(store))
+    spread = store.moving_average(fast)[-span:] - store.moving_average(slow)[-span:]
+    above = spread > 0
+    valid = ~np.isnan(spread)
+    changed = np.flatnonzero((above[1:] != above[:-1]) & valid[1:] & valid[:-1]) + 1
+
+    timestamps = store.index[-span:]
+    return [(timestamps[i], "golden" if above[i] else "death") for i in changed]
+
+
+def start_live_session(ticker):
+    """Seed a per-session live state with recent intraday bars."""
+    bars = fetch_bars_since(ticker)
+    return {
+        "ticker": ticker,
+        "store": IndicatorStore(bars, windows=(LIVE_FAST, LIVE_SLOW)),
+        "alerts": [],
+        "last_update_bars": len(bars),
+    }
+
+
+def update_live_session(session):
+    """
+    Fetch bars from the last one held on, correct that (possibly in-progress) bar, append
+    the newer ones and record any new crosses. Returns the number of bars written.
+    """
+    store = session["store"]
+    bars = fetch_bars_since(session["ticker"], store.last_timestamp)
+    count = store.append(bars)
+    if count:
+        # A corrected bar can report a cross that was already alerted
+        crosses = [cross for cross in new_crosses(store, count) if cross not in session["alerts"]]
+        session["alerts"] = (session["alerts"] + crosses)[-MAX_ALERTS:]
+    session["last_update_bars"] = count
+    return count
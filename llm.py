@@ -0,0 +1,391 @@
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from anthropic import APITimeoutError
+
+from cache_backend import cache_key, shared_cache
+
+# Models, overridable through the environment. The fast model is the default for every
+# analysis; the large model is used when the routing policy allows it.
+FAST_MODEL = os.getenv("CLAUDE_FAST_MODEL", "claude-3-haiku-20240307")
+LARGE_MODEL = os.getenv("CLAUDE_LARGE_MODEL", "claude-3-5-sonnet-20241022")
+
+# USD per million (input, output) tokens, for cost estimates
+MODEL_PRICES = {
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+}
+
+# Latency assumed for a model (seconds) until calls have been observed
+DEFAULT_LATENCY = {
+    FAST_MODEL: 12,
+    LARGE_MODEL: 35,
+}
+
+# Rough prompt size estimate; good enough for routing thresholds
+CHARS_PER_TOKEN = 4
+
+# Routing policy per analysis type:
+# - max_tokens: output cap for the final answer
+# - latency_target: seconds the final answer should take at most; routes that can use the
+#   large model need a target above its DEFAULT_LATENCY, or it is never picked before a call
+#   has been observed
+# - max_cost: USD a single call may cost at most (worst case, full max_tokens)
+# - large_above: estimated prompt tokens from which the large model is preferred (None: never)
+ROUTES = {
+    "Famous Investor Analysis": {"max_tokens": 2500, "latency_target": 40, "max_cost": 0.05, "large_above": 1500},
+    "Intrinsic Value Calculation": {"max_tokens": 3000, "latency_target": 40, "max_cost": 0.08, "large_above": 500},
+    "Technical Analysis": {"max_tokens": 3000, "latency_target": 40, "max_cost": 0.08, "large_above": 2000},
+    "Elliott Wave Analysis": {"max_tokens": 4000, "latency_target": 60, "max_cost": 0.15, "large_above": 4000},
+    "Market Condition Analysis": {"max_tokens": 2000, "latency_target": 20, "max_cost": 0.02, "large_above": None},
+    "Portfolio Risk Analysis": {"max_tokens": 3000, "latency_target": 60, "max_cost": 0.08, "large_above": 1500},
+    "Delta Update": {"max_tokens": 1200, "latency_target": 15, "max_cost": 0.02, "large_above": None},
+}
+DEFAULT_ROUTE = {"max_tokens": 4000, "latency_target": 60, "max_cost": 0.05, "large_above": None}
+
+# A structured answer cut off at max_tokens is retried once with this many times the cap
+RETRY_TOKEN_FACTOR = 2
+
+# Preliminary answers: short output from the fast model while the large one runs
+PRELIMINARY_MAX_TOKENS = 600
+PRELIMINARY_INSTRUCTION = (
+    "\n\nGive a brief preliminary take in under 150 words: the key points and a "
+    "tentative BUY, HOLD or SELL. A full analysis will follow separately."
+)
+
+# Structured output: with tool_choice forcing this tool, the analysis comes back as fields
+# instead of free text, so it can be rendered, cached, diffed and sorted without parsing
+ANALYSIS_TOOL_NAME = "record_analysis"
+_RANGE = {
+    "type": "object",
+    "properties": {
+        "low": {"type": ["number", "null"], "description": "Low end in USD per share"},
+        "high": {"type": ["number", "null"], "description": "High end in USD per share"},
+    },
+    "required": ["low", "high"],
+}
+ANALYSIS_TOOL = {
+    "name": ANALYSIS_TOOL_NAME,
+    "description": "Record the complete analysis. Use the sections the request asks for, in order, as section titles.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "summary": {"type": "string", "description": "Two or three sentence overview"},
+            "sections": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": "string"},
+                        "body": {"type": "string", "description": "Section text in Markdown"},
+                    },
+                    "required": ["title", "body"],
+                },
+            },
+            "recommendation": {"type": "string", "enum": ["BUY", "HOLD", "SELL", "NONE"],
+                               "description": "NONE when the analysis is not about a single stock"},
+            "target_price_range": {**_RANGE, "description": "12-month price target range, nulls if not given"},
+            "intrinsic_value_range": {**_RANGE, "description": "Intrinsic value range, nulls if not estimated"},
+            "key_metrics": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "value": {"type": "string"},
+                        "assessment": {"type": "string", "enum": ["positive", "neutral", "negative"]},
+                        "comment": {"type": "string"},
+                    },
+                    "required": ["name", "value", "assessment"],
+                },
+            },
+        },
+        "required": ["summary", "sections", "recommendation", "target_price_range", "intrinsic_value_range", "key_metrics"],
+    },
+}
+
+# Seconds an answer is reused for an identical prompt. Prompts embed the data snapshot, so a
+# new cache period produces a new prompt and a fresh answer.
+LLM_CACHE_TTL = 24 * 3600
+
+# Observed calls kept in memory for latency estimates
+MAX_RECORDS = 1000
+
+# Latency estimates use the most recent calls from the last hour only, so they follow API
+# conditions and a model ruled out by a slow spell is tried again later
+LATENCY_SAMPLE = 20
+LATENCY_WINDOW = 3600
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+
+
+def estimate_tokens(text):
+    """Approximate token count of a prompt."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_cost(model, prompt_tokens, max_tokens):
+    """Worst-case cost of a call in USD, or None for models without a known price."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + max_tokens * prices[1]) / 1_000_000
+
+
+class RoutingLog:
+    """
+    Routing decisions and observed call latencies, kept in memory and optionally appended
+    as JSON lines to a file (LLM_ROUTING_LOG) for offline tuning of the policy.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=MAX_RECORDS)
+
+    def record(self, **fields):
+        """Store one call record; `timestamp` is added automatically."""
+        record = {"timestamp": time.time(), **fields}
+        with self._lock:
+            self._records.append(record)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def expected_latency(self, model, analysis_type=None):
+        """
+        Median latency of recent completed calls to a model, preferring calls for the same
+        analysis type. Falls back to DEFAULT_LATENCY when no call was observed in the window.
+        """
+        since = time.time() - LATENCY_WINDOW
+        calls = [r for r in self.records() if r["model"] == model and r["latency"] is not None
+                 and not r.get("preliminary") and r["timestamp"] >= since]
+        same_type = [r for r in calls if r["analysis_type"] == analysis_type]
+        sample = (same_type or calls)[-LATENCY_SAMPLE:]
+        if not sample:
+            return DEFAULT_LATENCY.get(model, DEFAULT_LATENCY[FAST_MODEL])
+        return statistics.median(r["latency"] for r in sample)
+
+    def summary(self):
+        """Per (analysis type, model): call count, p50/p90 latency, timeouts and output tokens."""
+        return summarize_records(self.records())
+
+
+def summarize_records(records):
+    """Aggregate call records by analysis type and model."""
+    groups = {}
+    for record in records:
+        key = (record["analysis_type"], record["model"], bool(record.get("preliminary")))
+        groups.setdefault(key, []).append(record)
+
+    rows = []
+    for (analysis_type, model, preliminary), calls in sorted(groups.items()):
+        latencies = sorted(r["latency"] for r in calls if r["latency"] is not None)
+        rows.append({
+            "analysis_type": analysis_type,
+            "model": model,
+            "preliminary": preliminary,
+            "calls": len(calls),
+            "timeouts": sum(1 for r in calls if r.get("error") == "timeout"),
+            "p50_latency": latencies[len(latencies) // 2] if latencies else None,
+            "p90_latency": latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))] if latencies else None,
+            "avg_output_tokens": statistics.mean(r["output_tokens"] or 0 for r in calls),
+        })
+    return rows
+
+
+routing_log = RoutingLog(os.getenv("LLM_ROUTING_LOG"))
+
+
+def choose_route(analysis_type, prompt, deadline=None):
+    """
+    Pick the model and max_tokens for a prompt.
+
+    The large model is used when the prompt is at least the route's `large_above` tokens,
+    its worst-case cost is within `max_cost`, and its expected latency fits both the route's
+    latency target and the time left on the deadline. Otherwise the fast model is used.
+    Returns a dict with the model, max_tokens, estimated prompt tokens and the reason.
+    """
+    route = ROUTES.get(analysis_type, DEFAULT_ROUTE)
+    prompt_tokens = estimate_tokens(prompt)
+    max_tokens = route["max_tokens"]
+    budget = route["latency_target"]
+    if deadline is not None:
+        budget = min(budget, deadline.remaining())
+
+    if route["large_above"] is None or prompt_tokens < route["large_above"]:
+        model, reason = FAST_MODEL, "small prompt"
+    elif (estimate_cost(LARGE_MODEL, prompt_tokens, max_tokens) or 0) > route["max_cost"]:
+        model, reason = FAST_MODEL, "cost"
+    elif routing_log.expected_latency(LARGE_MODEL, analysis_type) > budget:
+        model, reason = FAST_MODEL, "latency"
+    else:
+        model, reason = LARGE_MODEL, "large prompt"
+
+    return {
+        "analysis_type": analysis_type,
+        "model": model,
+        "max_tokens": max_tokens,
+        "prompt_tokens": prompt_tokens,
+        "reason": reason,
+    }
+
+
+class IncompleteAnalysis(ValueError):
+    """Raised when a structured analysis is cut off at max_tokens, leaving partial fields."""
+
+
+def tool_input(message, name=ANALYSIS_TOOL_NAME):
+    """Input of the named tool_use block in a response. Raises ValueError when it is missing."""
+    for block in message.content:
+        if block.type == "tool_use" and block.name == name:
+            return block.input
+    raise ValueError("The response did not include a structured analysis")
+
+
+def complete(client, prompt, route, timeout=None, preliminary=False, structured=False, max_tokens=None):
+    """
+    Run one Claude call for a route and record its latency. Returns (result, record): the
+    response text, or the record_analysis fields as a dict when `structured` (preliminary
+    answers are always text), and the routing log record with the model and token usage.
+    `max_tokens` overrides the route's output cap. A text answer cut off at the cap is
+    returned with `truncated` set in its record; a cut-off structured answer raises
+    IncompleteAnalysis, since its fields are partial.
+    With a `timeout`, the SDK's automatic retries are disabled: each retry would get the
+    full timeout again, so the call could outlast the budget it was given.
+    """
+    if timeout is not None:
+        client = client.with_options(max_retries=0)
+    structured = structured and not preliminary
+    model = FAST_MODEL if preliminary else route["model"]
+    max_tokens = PRELIMINARY_MAX_TOKENS if preliminary else max_tokens or route["max_tokens"]
+    content = prompt + PRELIMINARY_INSTRUCTION if preliminary else prompt
+
+    started = time.perf_counter()
+    record = {
+        "analysis_type": route["analysis_type"],
+        "model": model,
+        "reason": route["reason"],
+        "preliminary": preliminary,
+        "structured": structured,
+        "prompt_tokens": route["prompt_tokens"],
+        "max_tokens": max_tokens,
+        "output_tokens": None,
+        "latency": None,
+        "error": None,
+        "truncated": False,
+    }
+    options = {}
+    if structured:
+        options = {"tools": [ANALYSIS_TOOL], "tool_choice": {"type": "tool", "name": ANALYSIS_TOOL_NAME}}
+    try:
+        message = client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=[
+                {"role": "user", "content": content}
+            ],
+            timeout=timeout,
+            **options
+        )
+    except Exception as e:
+        record["error"] = "timeout" if isinstance(e, APITimeoutError) else type(e).__name__
+        raise
+    else:
+        record["latency"] = time.perf_counter() - started
+        record["prompt_tokens"] = message.usage.input_tokens
+        record["output_tokens"] = message.usage.output_tokens
+        record["truncated"] = message.stop_reason == "max_tokens"
+        if structured and record["truncated"]:
+            record["error"] = "truncated"
+            raise IncompleteAnalysis(f"The structured analysis was cut off at {max_tokens} output tokens")
+        return (tool_input(message) if structured else message.content[0].text), record
+    finally:
+        routing_log.record(**record)
+
+
+def response_cache_key(analysis_type, prompt, structured=False):
+    """Shared cache key for the answer to a prompt, whichever model produced it."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return cache_key("llm", analysis_type, "structured" if structured else "text", digest)
+
+
+def run_analysis(client, analysis_type, prompt, deadline=None, on_preliminary=None, structured=False):
+    """
+    Route and run an analysis. Returns (result, record): the final response text (or fields,
+    if `structured`) and the routing log record of the call that produced it. Answers are
+    reused from the shared cache for identical prompts; their record has `cached` set.
+    Answers cut off at max_tokens are never cached: a structured one is retried once with
+    RETRY_TOKEN_FACTOR times the cap (IncompleteAnalysis if it is cut off again), a text one
+    is returned with `truncated` set in its record.
+
+    When `on_preliminary` is given and the large model was chosen, the large call starts in
+    the background and a short answer from the fast model is passed to `on_preliminary`
+    (on the calling thread) as soon as it arrives. A failed preliminary call is ignored.
+    """
+    key = response_cache_key(analysis_type, prompt, structured)
+    cached = shared_cache().get(key)
+    if cached is not None:
+        result, record = cached
+        return result, {**record, "cached": True}
+
+    route = choose_route(analysis_type, prompt, deadline)
+    timeout = deadline.remaining() if deadline is not None else None
+
+    def final_answer():
+        try:
+            return complete(client, prompt, route, timeout, structured=structured)
+        except IncompleteAnalysis:
+            if deadline is not None and deadline.expired:
+                raise
+            return complete(client, prompt, route, deadline.remaining() if deadline is not None else None,
+                            structured=structured, max_tokens=route["max_tokens"] * RETRY_TOKEN_FACTOR)
+
+    if on_preliminary is None or route["model"] == FAST_MODEL:
+        result, record = final_answer()
+    else:
+        final = _executor.submit(final_answer)
+        try:
+            on_preliminary(complete(client, prompt, route, timeout, preliminary=True)[0])
+        except Exception:
+            pass
+        result, record = final.result()
+
+    if not record["truncated"]:
+        shared_cache().set(key, (result, record), LLM_CACHE_TTL)
+    return result, {**record, "cached": False}
+
+
+def main():
+    """Command line entry point: summarise a routing log written via LLM_ROUTING_LOG."""
+    parser = argparse.ArgumentParser(description="Summarise recorded model routing decisions and latencies")
+    parser.add_argument("log", help="JSON lines file written via LLM_ROUTING_LOG")
+    args = parser.parse_args()
+
+    with open(args.log, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    header = f"{'Analysis':<28}{'Model':<28}{'Prelim':>7}{'Calls':>7}{'Timeouts':>10}{'p50 s':>8}{'p90 s':>8}{'Out tok':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in summarize_records(records):
+        p50 = f"{row['p50_latency']:.1f}" if row['p50_latency'] is not None else "-"
+        p90 = f"{row['p90_latency']:.1f}" if row['p90_latency'] is not None else "-"
+        print(f"{row['analysis_type']:<28}{row['model']:<28}{'yes' if row['preliminary'] else 'no':>7}"
+              f"{row['calls']:>7}{row['timeouts']:>10}{p50:>8}{p90:>8}{row['avg_output_tokens']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import bisect
+import threading
+
+import numpy as np
+
+from snapshot import numeric_value
+
+# info fields tracked for peer comparison, with the labels used in the metrics grid
+PEER_METRICS = {
+    "trailingPE": "P/E Ratio",
+    "priceToBook": "Price to Book",
+    "operatingMargins": "Operating Margin",
+    "profitMargins": "Profit Margin",
+    "returnOnEquity": "Return on Equity",
+    "debtToEquity": "Debt to Equity",
+}
+
+# Fall back from industry to sector peers when an industry has fewer tickers than this
+MIN_PEERS = 3
+
+
+def _percentile(ordered, q):
+    """Linearly interpolated percentile of a sorted list, as np.percentile computes it."""
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class PeerIndex:
+    """
+    Sector and industry peer statistics built from cached info snapshots.
+
+    Each group keeps one sorted list of values per metric, updated with bisect as tickers
+    are added or replaced, so medians, percentiles and per-ticker ranks are read directly
+    from the lists without rebuilding the group. Re-adding an unchanged snapshot is a no-op.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._members = {}
+        # group -> one sorted list of present values per PEER_METRICS column
+        self._sorted = {}
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def __contains__(self, ticker):
+        return ticker.upper() in self._snapshots
+
+    def add(self, ticker, info):
+        """Add or replace a ticker's snapshot."""
+        ticker = ticker.upper()
+        snapshot = {
+            "sector": info.get("sector"),
+            "industry": info.get("industry"),
+            "values": np.array([numeric_value(info.get(key)) for key in PEER_METRICS], dtype=float),
+        }
+
+        with self._lock:
+            previous = self._snapshots.get(ticker)
+            if previous is not None:
+                if (self._groups_of(previous) == self._groups_of(snapshot)
+                        and np.array_equal(previous["values"], snapshot["values"], equal_nan=True)):
+                    return
+                for group in self._groups_of(previous):
+                    self._members[group].discard(ticker)
+                    for column, value in enumerate(previous["values"]):
+                        if not np.isnan(value):
+                            ordered = self._sorted[group][column]
+                            del ordered[bisect.bisect_left(ordered, value)]
+
+            self._snapshots[ticker] = snapshot
+            for group in self._groups_of(snapshot):
+                self._members.setdefault(group, set()).add(ticker)
+                columns = self._sorted.setdefault(group, [[] for _ in PEER_METRICS])
+                for column, value in enumerate(snapshot["values"]):
+                    if not np.isnan(value):
+                        bisect.insort(columns[column], float(value))
+
+    def summary(self, ticker):
+        """
+        Peer-relative view of a ticker for prompts and the metrics grid.
+        Uses industry peers when there are enough of them, otherwise sector peers.
+        Returns None if the ticker has not been added or has no peers at all.
+        """
+        ticker = ticker.upper()
+        with self._lock:
+            snapshot = self._snapshots.get(ticker)
+            if snapshot is None:
+                return None
+
+            chosen = None
+            for group in self._groups_of(snapshot):
+                chosen = group
+                if len(self._members[group]) >= MIN_PEERS:
+                    break
+            if chosen is None or len(self._members[chosen]) < 2:
+                return None
+
+            metrics = self._group_metrics(chosen)
+            for position, key in enumerate(PEER_METRICS):
+                value = snapshot["values"][position]
+                ordered = self._sorted[chosen][position]
+                metric = metrics[key]
+                metric["label"] = PEER_METRICS[key]
+                metric["value"] = None if np.isnan(value) else float(value)
+                # Percentile rank = share of other peers with a strictly lower value
+                metric["percentile"] = None
+                if metric["value"] is not None and len(ordered) > 1:
+                    below = bisect.bisect_left(ordered, metric["value"])
+                    metric["percentile"] = round(below / (len(ordered) - 1) * 100, 1)
+
+            return {
+                "level": chosen[0],
+                "name": chosen[1],
+                "peer_count": len(self._members[chosen]),
+                "metrics": metrics,
+            }
+
+    @staticmethod
+    def _groups_of(snapshot):
+        """Groups a snapshot belongs to, most specific first."""
+        groups = []
+        if snapshot["industry"]:
+            groups.append(("industry", snapshot["industry"]))
+        if snapshot["sector"]:
+            groups.append(("sector", snapshot["sector"]))
+        return groups
+
+    def _group_metrics(self, group):
+        """Count, median and quartiles of each metric in a group. Caller holds the lock."""
+        metrics = {}
+        for column, key in enumerate(PEER_METRICS):
+            ordered = self._sorted[group][column]
+            if ordered:
+                metrics[key] = {
+                    "count": len(ordered),
+                    "median": _percentile(ordered, 50),
+                    "p25": _percentile(ordered, 25),
+                    "p75": _percentile(ordered, 75),
+                }
+            else:
+                metrics[key] = {"count": 0, "median": None, "p25": None, "p75": None}
+        return metrics
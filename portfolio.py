@@ -0,0 +1,180 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from indicators import by_trading_date
+
+TRADING_DAYS = 252
+BENCHMARK = "SPY"
+
+# Number of most/least correlated pairs reported in the summary
+TOP_PAIRS = 5
+
+
+def parse_holdings(text):
+    """
+    Parse holdings such as "AAPL:40, MSFT 30, GOOGL=30" into {ticker: weight}.
+    Tickers without a weight are equal-weighted. Weights are normalised to sum to 1.
+    Raises ValueError for malformed input.
+    """
+    holdings = {}
+    for entry in re.split(r"[,\n;]+", text or ""):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = re.split(r"[\s:=]+", entry)
+        ticker = parts[0].upper()
+        if len(parts) == 1:
+            weight = 1.0
+        elif len(parts) == 2:
+            try:
+                weight = float(parts[1].rstrip("%"))
+            except ValueError:
+                raise ValueError(f"Invalid weight for {ticker}: {parts[1]}")
+        else:
+            raise ValueError(f"Could not parse holding: {entry}")
+        if weight < 0:
+            raise ValueError(f"Negative weight for {ticker}")
+        holdings[ticker] = holdings.get(ticker, 0.0) + weight
+
+    total = sum(holdings.values())
+    if not holdings or total <= 0:
+        raise ValueError("Enter at least one holding with a positive weight")
+    return {ticker: weight / total for ticker, weight in holdings.items()}
+
+
+def aligned_returns(closes):
+    """
+    Daily simple returns for several price series, aligned on common trading days.
+    `closes` maps ticker -> Series of closing prices. Returns a DataFrame (days x tickers).
+    """
+    frame = pd.concat({ticker: by_trading_date(close) for ticker, close in closes.items()}, axis=1, join="inner")
+    return frame.pct_change().dropna(how="any")
+
+
+def max_drawdowns(returns):
+    """Maximum drawdown of each column of a (days x assets) return matrix, as negative fractions."""
+    wealth = np.cumprod(1 + returns, axis=0)
+    peaks = np.maximum.accumulate(wealth, axis=0)
+    return (wealth / peaks - 1).min(axis=0)
+
+
+def portfolio_risk(returns, weights, benchmark=None):
+    """
+    Risk statistics for a portfolio, computed as batched matrix operations.
+
+    returns: (days, assets) array of daily returns
+    weights: (assets,) array summing to 1
+    benchmark: optional (days,) array of benchmark returns for beta
+    All volatilities and covariances are annualised.
+    """
+    returns = np.asarray(returns, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    days = returns.shape[0]
+
+    demeaned = returns - returns.mean(axis=0)
+    covariance = demeaned.T @ demeaned / (days - 1) * TRADING_DAYS
+    volatility = np.sqrt(np.diag(covariance))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = covariance / np.outer(volatility, volatility)
+
+    portfolio_variance = weights @ covariance @ weights
+    portfolio_volatility = np.sqrt(portfolio_variance)
+    # Share of portfolio variance contributed by each holding
+    with np.errstate(divide="ignore", invalid="ignore"):
+        risk_contribution = weights * (covariance @ weights) / portfolio_variance
+
+    portfolio_returns = returns @ weights
+    result = {
+        "covariance": covariance,
+        "correlation": correlation,
+        "volatility": volatility,
+        "portfolio_volatility": float(portfolio_volatility),
+        "risk_contribution": risk_contribution,
+        "max_drawdown": max_drawdowns(returns),
+        "portfolio_max_drawdown": float(max_drawdowns(portfolio_returns[:, None])[0]),
+        "annual_return": (1 + returns).prod(axis=0) ** (TRADING_DAYS / days) - 1,
+        "portfolio_annual_return": float((1 + portfolio_returns).prod() ** (TRADING_DAYS / days) - 1),
+        "beta": None,
+        "portfolio_beta": None,
+    }
+
+    if benchmark is not None:
+        benchmark = np.asarray(benchmark, dtype=float)
+        benchmark_demeaned = benchmark - benchmark.mean()
+        # Betas of every holding against the benchmark in a single matrix-vector product
+        betas = demeaned.T @ benchmark_demeaned / (benchmark_demeaned @ benchmark_demeaned)
+        result["beta"] = betas
+        result["portfolio_beta"] = float(weights @ betas)
+
+    return result
+
+
+def correlated_pairs(correlation, tickers, count=TOP_PAIRS):
+    """Most and least correlated pairs of holdings, as (ticker, ticker, correlation) tuples."""
+    rows, cols = np.triu_indices(len(tickers), k=1)
+    if not len(rows):
+        return [], []
+    values = correlation[rows, cols]
+    order = np.argsort(values)
+    pairs = [(tickers[rows[i]], tickers[cols[i]], round(float(values[i]), 2)) for i in order]
+    return pairs[::-1][:count], pairs[:count]
+
+
+def summarize_portfolio(holdings, closes, benchmark_close=None):
+    """
+    Build a compact portfolio risk summary.
+
+    holdings: {ticker: weight}
+    closes: {ticker: Series of closing prices}, should include the benchmark when given
+    benchmark_close: optional Series of benchmark closing prices
+    Tickers without price data are reported in "missing" and their weight is redistributed.
+    """
+    available = [t for t in holdings if t in closes and closes[t] is not None and len(closes[t]) > 1]
+    missing = [t for t in holdings if t not in available]
+    if not available:
+        raise ValueError("No price history available for any holding")
+
+    series = {t: closes[t] for t in available}
+    if benchmark_close is not None:
+        series[BENCHMARK + " (benchmark)"] = benchmark_close
+    returns = aligned_returns(series)
+    if len(returns) < 2:
+        raise ValueError("Not enough overlapping price history to measure risk")
+
+    weights = np.array([holdings[t] for t in available])
+    weights = weights / weights.sum()
+    asset_returns = returns[available].to_numpy()
+    benchmark_returns = returns[BENCHMARK + " (benchmark)"].to_numpy() if benchmark_close is not None else None
+
+    risk = portfolio_risk(asset_returns, weights, benchmark_returns)
+    most_correlated, least_correlated = correlated_pairs(risk["correlation"], available)
+
+    holdings_table = pd.DataFrame({
+        "Weight": weights,
+        "Annual Return": risk["annual_return"],
+        "Volatility": risk["volatility"],
+        "Beta": risk["beta"] if risk["beta"] is not None else np.nan,
+        "Max Drawdown": risk["max_drawdown"],
+        "Risk Contribution": risk["risk_contribution"],
+    }, index=available)
+
+    return {
+        "tickers": available,
+        "missing": missing,
+        "start": returns.index[0].date().isoformat(),
+        "end": returns.index[-1].date().isoformat(),
+        "days": len(returns),
+        "portfolio_volatility": risk["portfolio_volatility"],
+        "portfolio_beta": risk["portfolio_beta"],
+        "portfolio_max_drawdown": risk["portfolio_max_drawdown"],
+        "portfolio_annual_return": risk["portfolio_annual_return"],
+        "average_correlation": float(
+            risk["correlation"][np.triu_indices(len(available), k=1)].mean()
+        ) if len(available) > 1 else None,
+        "most_correlated": most_correlated,
+        "least_correlated": least_correlated,
+        "holdings": holdings_table,
+        "correlation": pd.DataFrame(risk["correlation"], index=available, columns=available),
+    }
@@ -0,0 +1,213 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from archive import get_archive
+from data import (
+    MARKET_CLOSE,
+    MARKET_OPEN,
+    MARKET_TZ,
+    cache_period,
+    get_market_snapshot,
+    get_peer_index,
+    get_request_counter,
+    get_stock_info,
+    is_market_open,
+    load_price_store,
+    record_snapshot,
+)
+from delta import analysis_inputs, market_inputs
+from llm import run_analysis
+
+logger = logging.getLogger(__name__)
+
+# Tickers always kept warm; override with a comma separated PREWARM_TICKERS
+DEFAULT_PREWARM_TICKERS = "SPY,QQQ,AAPL,MSFT,NVDA,AMZN,GOOGL,META,TSLA,BRK-B"
+
+# How many of the most requested tickers to warm in addition to the configured list
+MOST_REQUESTED = 20
+
+# How many of the most requested (ticker, analysis) combinations get their Claude answer
+# precomputed for each period. Every warmed answer is a paid call, so this is off (0) unless
+# PREWARM_ANALYSES is set. Warmed answers are used when the app builds the same prompt.
+PREWARM_ANALYSES = int(os.getenv("PREWARM_ANALYSES", "0"))
+
+# Warm the next cache period this long before it starts
+LEAD_TIME = timedelta(minutes=3)
+
+# After the close, wait for final bars before warming the overnight period
+CLOSE_SETTLE_TIME = timedelta(minutes=5)
+
+
+def prewarm_tickers():
+    """Configured tickers plus the most requested ones, without duplicates."""
+    configured = os.getenv("PREWARM_TICKERS", DEFAULT_PREWARM_TICKERS)
+    tickers = [t.strip().upper() for t in configured.split(",") if t.strip()]
+    tickers += get_request_counter().most_common(MOST_REQUESTED)
+    return list(dict.fromkeys(tickers))
+
+
+def next_warm_time(now=None):
+    """
+    When to run next and which cache period to warm, as (run_at, period_start).
+
+    While the market is open each hourly period is warmed shortly before it begins; the
+    overnight period is warmed once the close has settled, and the first period of the
+    next session shortly before the open.
+    """
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+
+    if is_market_open(now):
+        next_hour = (now + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+        close = now.replace(hour=MARKET_CLOSE.hour, minute=MARKET_CLOSE.minute, second=0, microsecond=0)
+        if next_hour >= close:
+            return close + CLOSE_SETTLE_TIME, close + CLOSE_SETTLE_TIME
+        return max(now, next_hour - LEAD_TIME), next_hour
+
+    # Next weekday open
+    day = now.date()
+    if now.time() >= MARKET_OPEN:
+        day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    market_open = datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TZ)
+    return max(now, market_open - LEAD_TIME), market_open
+
+
+def analysis_prompt(ticker, analysis_type, persona, as_of, period="1y"):
+    """
+    The prompt and inputs the app builds for an analysis from the cached data of a period,
+    as (subject, prompt, inputs). Types that need user input (portfolio, screener) give None.
+    """
+    from prompts import (
+        get_elliott_wave_analysis_prompt,
+        get_intrinsic_value_prompt,
+        get_investor_prompt,
+        get_market_condition_prompt,
+        get_technical_analysis_prompt,
+    )
+    from valuation import compute_valuation
+
+    if analysis_type == "Market Condition Analysis":
+        market_snapshot = get_market_snapshot(as_of)
+        return "MARKET", get_market_condition_prompt(market_snapshot), market_inputs(market_snapshot)
+
+    store = load_price_store(ticker, period, as_of)
+    info = get_stock_info(ticker, as_of)
+    peers = get_peer_index().summary(ticker)
+    if analysis_type == "Famous Investor Analysis":
+        prompt = get_investor_prompt(persona, ticker, info, peers)
+    elif analysis_type == "Intrinsic Value Calculation":
+        prompt = get_intrinsic_value_prompt(ticker, info, compute_valuation(info), peers)
+    elif analysis_type == "Technical Analysis":
+        prompt = get_technical_analysis_prompt(ticker, store.frame)
+    elif analysis_type == "Elliott Wave Analysis":
+        prompt = get_elliott_wave_analysis_prompt(ticker, store.frame)
+    else:
+        return None
+    return ticker, prompt, analysis_inputs(info, store)
+
+
+def warm_analyses(client, as_of, count=PREWARM_ANALYSES):
+    """
+    Run the `count` most requested analyses for a period through the shared LLM cache and
+    archive the new answers, as the app would. Returns the number of answers produced.
+    """
+    produced = 0
+    for ticker, analysis_type, persona, structured in get_request_counter().most_common_analyses(count):
+        try:
+            built = analysis_prompt(ticker, analysis_type, persona, as_of)
+            if built is None:
+                continue
+            subject, prompt, inputs = built
+            result, record = run_analysis(client, analysis_type, prompt, structured=structured)
+        except Exception as e:
+            logger.warning("Pre-warming %s for %s failed: %s", analysis_type, ticker, e)
+            continue
+        if not record["cached"] and not record.get("truncated"):
+            get_archive().add(subject, analysis_type, result, prompt, persona=persona, as_of=as_of,
+                              model=record["model"], input_tokens=record["prompt_tokens"],
+                              output_tokens=record["output_tokens"], inputs=inputs)
+            produced += 1
+    return produced
+
+
+def warm(tickers, as_of, period="1y", client=None):
+    """
+    Fill the price, fundamentals and market snapshot caches for one cache period, and
+    precompute the local analyses (indicators, peer index) that depend on them. With a
+    Claude `client` and PREWARM_ANALYSES set, the most requested analyses are run as well.
+    Returns the number of tickers warmed successfully.
+    """
+    warmed = 0
+    for ticker in tickers:
+        try:
+            load_price_store(ticker, period, as_of)
+            info = get_stock_info(ticker, as_of)
+        except Exception as e:
+            logger.warning("Pre-warming %s failed: %s", ticker, e)
+            continue
+        record_snapshot(ticker, info)
+        warmed += 1
+
+    try:
+        get_market_snapshot(as_of)
+    except Exception as e:
+        logger.warning("Pre-warming market snapshot failed: %s", e)
+
+    if client is not None and PREWARM_ANALYSES:
+        logger.info("Pre-warmed %d analyses for %s", warm_analyses(client, as_of), as_of)
+    return warmed
+
+
+class PrewarmScheduler(threading.Thread):
+    """Background thread that keeps the data caches warm on a market-hours-aware schedule."""
+
+    def __init__(self, client=None):
+        super().__init__(name="cache-prewarm", daemon=True)
+        self.client = client
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        # Warm the current period straight away, then stay one period ahead
+        warmed = cache_period()
+        self._warm(warmed)
+        while not self._stop_event.is_set():
+            run_at, period_start = next_warm_time()
+            as_of = cache_period(period_start)
+            if as_of == warmed:
+                # Already ahead; sleep until that period begins before planning again
+                run_at = period_start + timedelta(seconds=1)
+                as_of = None
+            delay = (run_at - datetime.now(MARKET_TZ)).total_seconds()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+            if as_of is not None:
+                self._warm(as_of)
+                warmed = as_of
+
+    def _warm(self, as_of):
+        tickers = prewarm_tickers()
+        started = datetime.now(MARKET_TZ)
+        count = warm(tickers, as_of, client=self.client)
+        logger.info("Pre-warmed %d/%d tickers for %s in %.1fs",
+                    count, len(tickers), as_of, (datetime.now(MARKET_TZ) - started).total_seconds())
+
+
+@st.cache_resource(show_spinner=False)
+def start_prewarm_scheduler(_client=None):
+    """
+    Start one scheduler per process. Disabled by setting PREWARM_ENABLED=0. `_client` is the
+    Claude client used for PREWARM_ANALYSES (not part of the cache key).
+    """
+    if os.getenv("PREWARM_ENABLED", "1") == "0":
+        return None
+    scheduler = PrewarmScheduler(_client)
+    scheduler.start()
+    return scheduler
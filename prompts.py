@@ -1,7 +1,27 @@
 import json
-import yfinance as yf
+import pandas as pd
 
-def get_investor_prompt(investor, ticker, stock_info):
+from delta import is_rate
+from valuation import compute_valuation
+
+def _format_peer_comparison(peers):
+    """Describe locally computed peer statistics for a prompt."""
+    if not peers:
+        return "Peer Comparison: No peer data available yet."
+    
+    lines = [f"Peer Comparison ({peers['level']}: {peers['name']}, {peers['peer_count']} companies):"]
+    for metric in peers['metrics'].values():
+        if metric['median'] is None:
+            continue
+        percentile = f", percentile rank {metric['percentile']:.0f}" if metric['percentile'] is not None else ""
+        value = f"{metric['value']:.2f}" if metric['value'] is not None else "N/A"
+        lines.append(
+            f"- {metric['label']}: {value} vs peer median {metric['median']:.2f} "
+            f"(interquartile range {metric['p25']:.2f} - {metric['p75']:.2f}{percentile})"
+        )
+    return "\n".join(lines)
+
+def get_investor_prompt(investor, ticker, stock_info, peers=None):
     """Generate a prompt for famous investor analysis."""
     
     # Common financial metrics if available
@@ -56,6 +76,8 @@ Financial Data:
 
 Sector: {financial_data['sector']}
 Industry: {financial_data['industry']}
+
+{_format_peer_comparison(peers)}
 """
     
     # Investor-specific prompts
@@ -180,18 +202,42 @@ Provide a detailed stock analysis covering:
 
     return prompt
 
-def get_intrinsic_value_prompt(ticker, stock_info):
-    """Generate a prompt for intrinsic value analysis."""
+def _format_value(value, prefix="$"):
+    """Format a precomputed value for a prompt, or N/A when it could not be computed."""
+    return f"{prefix}{value:,.2f}" if value is not None else "N/A"
+
+def _format_sensitivity_table(discount_rates, growth_rates, grid):
+    """Render a discount-rate x growth-rate grid as a plain-text table."""
+    header = "Discount rate \\ Growth | " + " | ".join(f"{g:.0%}" for g in growth_rates)
+    rows = [header]
+    for rate, values in zip(discount_rates, grid):
+        cells = " | ".join(_format_value(v) for v in values)
+        rows.append(f"{rate:.1%} | {cells}")
+    return "\n".join(rows)
+
+def get_intrinsic_value_prompt(ticker, stock_info, valuation=None, peers=None):
+    """
+    Generate a prompt for intrinsic value analysis.
+    Valuation figures are computed locally (see valuation.py); the model only interprets them.
+    """
+    if valuation is None:
+        valuation = compute_valuation(stock_info)
+    
+    industry_pe = "Not enough peer data"
+    if peers and peers['metrics']['trailingPE']['median'] is not None:
+        industry_pe = f"{peers['metrics']['trailingPE']['median']:.2f} (median of {peers['level']} peers)"
+    
+    low, high = valuation['value_range']
+    margin = valuation['margin_of_safety']
+    dcf_table = _format_sensitivity_table(
+        valuation['grid_discount_rates'], valuation['grid_growth_rates'], valuation['dcf_grid'])
+    ddm_table = _format_sensitivity_table(
+        valuation['grid_discount_rates'], valuation['grid_growth_rates'], valuation['ddm_grid'])
     
     prompt = f"""
-As a financial analyst specializing in valuation, calculate and explain the intrinsic value of {ticker} ({stock_info.get('longName', ticker)}).
+As a financial analyst specializing in valuation, interpret the intrinsic value of {ticker} ({stock_info.get('longName', ticker)}).
 
-Use multiple valuation methods including:
-1. Discounted Cash Flow (DCF) Analysis
-2. Dividend Discount Model (if applicable)
-3. Comparable Company Analysis (using industry P/E, P/B, P/S ratios)
-4. Graham's Number (Benjamin Graham's formula)
-5. Asset-based valuation
+The valuations below have already been calculated. Do not recalculate them; explain what they mean for this company.
 
 Current financial data:
 - Current Price: ${stock_info.get('currentPrice', 'N/A')}
@@ -202,23 +248,40 @@ Current financial data:
 - Historical Growth Rate: {stock_info.get('earningsGrowth', 'N/A')}
 - Expected 5-Year Growth Rate: {stock_info.get('earningsQuarterlyGrowth', 'N/A')}
 - Current P/E Ratio: {stock_info.get('trailingPE', 'N/A')}
-- Industry Average P/E: Calculate based on peers
+- Industry Average P/E: {industry_pe}
 - Dividend Yield: {stock_info.get('dividendYield', 'N/A')}
 - Beta: {stock_info.get('beta', 'N/A')}
 
-For the DCF calculation:
-- Use a discount rate that accounts for the company's risk profile, beta, and current market conditions
-- Project cash flows for 5-10 years with justifiable growth assumptions
-- Calculate a terminal value using a reasonable perpetuity growth rate
+Assumptions used:
+- Discount rate (CAPM): {valuation['discount_rate']:.2%}
+- Base-case growth rate: {valuation['base_growth']:.2%} for {valuation['projection_years']} years
+- Terminal growth rate: {valuation['terminal_growth']:.2%}
+
+Precomputed intrinsic values per share:
+- Discounted Cash Flow (DCF): {_format_value(valuation['dcf'])}
+- Dividend Discount Model (DDM): {_format_value(valuation['ddm'])}
+- Graham's Number: {_format_value(valuation['graham_number'])}
+- Asset-based (book value): {_format_value(valuation['book_value'])}
+- Range across methods: {_format_value(low)} - {_format_value(high)}
+- Median of methods: {_format_value(valuation['median_value'])}
+- Margin of safety at current price: {f"{margin:.1%}" if margin is not None else "N/A"}
+
+{_format_peer_comparison(peers)}
+
+DCF sensitivity (value per share):
+{dcf_table}
+
+DDM sensitivity (value per share; dividends grow at the column rate for the projection years, then at the terminal rate):
+{ddm_table}
 
 For each valuation method:
-1. Show your calculations step-by-step
-2. Explain key assumptions you're making
-3. Provide a sensitivity analysis for critical variables
-4. Discuss the strengths and limitations of each approach for this specific company
+1. Explain whether the key assumptions are reasonable for this company
+2. Interpret what the sensitivity table says about how fragile the estimate is
+3. Discuss the strengths and limitations of the approach for this specific company
+4. Use the peer comparison for a Comparable Company Analysis (relative P/E, P/B, margins, ROE)
 
 Conclude with:
-1. A range of intrinsic values derived from different methods
+1. The range of intrinsic values you consider most credible, based on the figures above
 2. Your assessment of which valuation method is most appropriate for this company and why
 3. The margin of safety at current prices
 4. A buy/hold/sell recommendation based on the valuation analysis
@@ -288,50 +351,16 @@ Recent price data sample: {history_sample}
     
     return prompt
 
-def get_market_condition_prompt():
-    """Generate a prompt for market condition analysis."""
-    
-    # Fetch current market data for the prompt
-    try:
-        # Prepare tickers to fetch data
-        tickers = ["SPY", "QQQ", "IWM", "^VIX", 
-                  "XLK", "XLF", "XLV", "XLE", "XLY", 
-                  "XLP", "XLI", "XLB", "XLU", "XLRE", "XLC"]
-        
-        # Dictionary to store results
-        market_data = {}
-        sector_data = {}
-        
-        # Define sector names
-        sectors = {
-            "XLK": "Technology",
-            "XLF": "Financial",
-            "XLV": "Healthcare",
-            "XLE": "Energy",
-            "XLY": "Consumer Discretionary",
-            "XLP": "Consumer Staples",
-            "XLI": "Industrial",
-            "XLB": "Materials",
-            "XLU": "Utilities",
-            "XLRE": "Real Estate",
-            "XLC": "Communication Services"
-        }
-        
-        # Fetch data for each ticker
-        for symbol in tickers:
-            ticker_data = yf.Ticker(symbol).history(period="1mo")
-            if not ticker_data.empty:
-                if symbol in ["SPY", "QQQ", "IWM"]:
-                    perf = ((ticker_data['Close'].iloc[-1] / ticker_data['Close'].iloc[0]) - 1) * 100
-                    market_data[symbol] = f"{perf:.2f}%"
-                elif symbol == "^VIX":
-                    market_data[symbol] = f"{ticker_data['Close'].iloc[-1]:.2f}"
-                elif symbol in sectors:
-                    perf = ((ticker_data['Close'].iloc[-1] / ticker_data['Close'].iloc[0]) - 1) * 100
-                    sector_data[sectors[symbol]] = f"{perf:.2f}%"
-    except Exception as e:
-        market_data = {"SPY": "N/A", "QQQ": "N/A", "IWM": "N/A", "^VIX": "N/A"}
-        sector_data = {name: "N/A" for name in sectors.values()}
+def get_market_condition_prompt(market_snapshot=None):
+    """
+    Generate a prompt for market condition analysis.
+    `market_snapshot` is the (market_data, sector_data) pair from data.get_market_snapshot;
+    it is fetched on demand when omitted.
+    """
+    if market_snapshot is None:
+        from data import cache_period, get_market_snapshot
+        market_snapshot = get_market_snapshot(cache_period())
+    market_data, sector_data = market_snapshot
     
     # Format as JSON string
     sector_performance = json.dumps(sector_data, indent=2)
@@ -391,6 +420,65 @@ Provide a well-structured analysis with clear explanations of the data's signifi
     
     return prompt
 
+def get_portfolio_prompt(summary):
+    """Generate a prompt for portfolio-level risk analysis from a summarize_portfolio() result."""
+    
+    def pct(value):
+        return f"{value:.2%}" if value is not None else "N/A"
+    
+    holdings_lines = []
+    for ticker, row in summary['holdings'].iterrows():
+        beta = f"{row['Beta']:.2f}" if pd.notna(row['Beta']) else "N/A"
+        holdings_lines.append(
+            f"- {ticker}: weight {row['Weight']:.1%}, annual return {row['Annual Return']:.1%}, "
+            f"volatility {row['Volatility']:.1%}, beta {beta}, max drawdown {row['Max Drawdown']:.1%}, "
+            f"risk contribution {row['Risk Contribution']:.1%}"
+        )
+    holdings_text = "\n".join(holdings_lines)
+    most_correlated = "\n".join(f"- {a} / {b}: {c:.2f}" for a, b, c in summary['most_correlated']) or "- N/A"
+    least_correlated = "\n".join(f"- {a} / {b}: {c:.2f}" for a, b, c in summary['least_correlated']) or "- N/A"
+    portfolio_beta = f"{summary['portfolio_beta']:.2f}" if summary['portfolio_beta'] is not None else "N/A"
+    average_correlation = f"{summary['average_correlation']:.2f}" if summary['average_correlation'] is not None else "N/A"
+    
+    prompt = f"""
+As a portfolio manager, review the risk profile of the following portfolio.
+All statistics below were calculated from daily returns between {summary['start']} and {summary['end']} ({summary['days']} trading days). Do not recalculate them.
+
+Portfolio Statistics:
+- Annualized Volatility: {pct(summary['portfolio_volatility'])}
+- Beta to S&P 500 (SPY): {portfolio_beta}
+- Maximum Drawdown: {pct(summary['portfolio_max_drawdown'])}
+- Annualized Return: {pct(summary['portfolio_annual_return'])}
+- Average Pairwise Correlation: {average_correlation}
+
+Holdings:
+{holdings_text}
+
+Most Correlated Pairs:
+{most_correlated}
+
+Least Correlated Pairs:
+{least_correlated}
+
+Analyze the following:
+1. Diversification - which holdings move together and whether the portfolio is concentrated in a single risk factor
+2. Risk concentration - holdings whose risk contribution is out of proportion to their weight
+3. Market sensitivity - what the portfolio beta implies in a market sell-off
+4. Drawdown risk - the worst historical losses and how an investor might experience them
+5. Rebalancing ideas - changes to weights or additions that would improve the risk profile
+
+Format your response with clear sections for:
+- Initial impression
+- Diversification analysis
+- Risk concentration
+- Market sensitivity
+- Drawdown risk
+- Rebalancing suggestions
+- Conclusion
+"""
+    
+    return prompt
+
 def get_elliott_wave_analysis_prompt(ticker, history):
     """Generate a prompt for Elliott Wave analysis."""
     
@@ -451,4 +539,50 @@ Format your response with clear sections for:
 Recent price data sample: {history_sample}
 """
     
-    return prompt 
\ No newline at end of file
+    return prompt
+
+def _format_number(value):
+    """Compact number for a delta prompt (1.05T, 3.2B, 0.153)."""
+    for size, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+        if abs(value) >= size:
+            return f"{value / size:.2f}{suffix}"
+    return f"{value:.4g}"
+
+def _format_change(key, old, new):
+    """One changed input for a delta prompt, with the move for numbers (in points for rates)."""
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        if is_rate(key):
+            return f"{old:.2%} -> {new:.2%} ({(new - old) * 100:+.2f} points)"
+        move = f" ({(new - old) / abs(old):+.1%})" if old else ""
+        return f"{_format_number(old)} -> {_format_number(new)}{move}"
+    return f"{old if old is not None else 'N/A'} -> {new if new is not None else 'N/A'}"
+
+def get_delta_prompt(subject, analysis_title, previous_date, conclusions, changes):
+    """
+    Generate a prompt that updates a previous analysis from the inputs that changed since.
+    `changes` are (key, label, old, new) tuples from delta.diff_inputs.
+    """
+    change_lines = "\n".join(f"- {label}: {_format_change(key, old, new)}" for key, label, old, new in changes)
+    
+    prompt = f"""
+You previously wrote a {analysis_title} for {subject} on {previous_date:%Y-%m-%d}. Its conclusions were:
+
+{conclusions}
+
+Since then, these inputs have changed (previous -> current):
+{change_lines}
+
+All other inputs are unchanged. Update the analysis for these changes only:
+1. Which of the previous conclusions still hold, and which need revising
+2. How each material change affects the thesis, valuation or price levels
+3. The updated buy/hold/sell recommendation (or outlook), and whether it changed
+
+Be concise and do not repeat unchanged reasoning.
+
+Format your response with clear sections for:
+- What Changed
+- Impact on the Analysis
+- Updated Conclusion
+"""
+    
+    return prompt
@@ -0,0 +1,246 @@
+import argparse
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+
+# Text fields read from yfinance info by the app, prompts and indexes
+TEXT_FIELDS = (
+    "longName",
+    "sector",
+    "industry",
+    "country",
+    "website",
+    "logo_url",
+    "longBusinessSummary",
+)
+
+# Numeric fields read from yfinance info
+NUMERIC_FIELDS = (
+    "currentPrice",
+    "marketCap",
+    "fiftyTwoWeekLow",
+    "fiftyTwoWeekHigh",
+    "trailingPE",
+    "forwardPE",
+    "pegRatio",
+    "trailingEps",
+    "forwardEps",
+    "dividendYield",
+    "dividendRate",
+    "bookValue",
+    "priceToBook",
+    "returnOnEquity",
+    "debtToEquity",
+    "freeCashflow",
+    "operatingMargins",
+    "profitMargins",
+    "revenueGrowth",
+    "earningsGrowth",
+    "earningsQuarterlyGrowth",
+    "beta",
+    "sharesOutstanding",
+)
+
+# Default snapshot cache limits
+MAX_SNAPSHOTS = 5000
+MAX_SNAPSHOT_BYTES = 32 * 1024 * 1024
+
+
+def numeric_value(value):
+    """Float value of an info field, or None when missing or non-numeric (booleans included)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+@dataclass(frozen=True, slots=True)
+class FundamentalsSnapshot:
+    """
+    The subset of a yfinance info dict the app actually reads, with numeric fields as floats.
+
+    Field names match the info keys and `get` mirrors dict.get, so a snapshot can be passed
+    anywhere an info dict was used. Instances are immutable and safe to share between sessions.
+    """
+
+    longName: str = None
+    sector: str = None
+    industry: str = None
+    country: str = None
+    website: str = None
+    logo_url: str = None
+    longBusinessSummary: str = None
+    currentPrice: float = None
+    marketCap: float = None
+    fiftyTwoWeekLow: float = None
+    fiftyTwoWeekHigh: float = None
+    trailingPE: float = None
+    forwardPE: float = None
+    pegRatio: float = None
+    trailingEps: float = None
+    forwardEps: float = None
+    dividendYield: float = None
+    dividendRate: float = None
+    bookValue: float = None
+    priceToBook: float = None
+    returnOnEquity: float = None
+    debtToEquity: float = None
+    freeCashflow: float = None
+    operatingMargins: float = None
+    profitMargins: float = None
+    revenueGrowth: float = None
+    earningsGrowth: float = None
+    earningsQuarterlyGrowth: float = None
+    beta: float = None
+    sharesOutstanding: float = None
+
+    @classmethod
+    def from_info(cls, info):
+        """Build a snapshot from a raw info dict, dropping unused keys and non-numeric values."""
+        values = {}
+        for key in TEXT_FIELDS:
+            value = info.get(key)
+            values[key] = str(value) if value not in (None, "") else None
+        for key in NUMERIC_FIELDS:
+            value = info.get(key)
+            values[key] = numeric_value(value)
+        return cls(**values)
+
+    def __bool__(self):
+        # Mirror an empty info dict: a snapshot with no data is falsy
+        return any(getattr(self, f.name) is not None for f in fields(self))
+
+    def get(self, key, default=None):
+        """dict.get-style access by info key; missing or unknown fields return `default`."""
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def to_dict(self):
+        """Populated fields as a plain dict."""
+        return {f.name: getattr(self, f.name) for f in fields(self) if getattr(self, f.name) is not None}
+
+
+def deep_sizeof(value, seen=None):
+    """Approximate memory footprint of an object graph in bytes."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in value)
+    elif hasattr(value, "__slots__"):
+        size += sum(deep_sizeof(getattr(value, name), seen) for name in value.__slots__ if hasattr(value, name))
+    return size
+
+
+class SnapshotCache:
+    """
+    Thread-safe LRU cache of snapshots bounded by entry count, total bytes and age.
+    Values are stored as-is (no pickling), so a hit returns the shared immutable snapshot.
+    """
+
+    def __init__(self, max_entries=MAX_SNAPSHOTS, max_bytes=MAX_SNAPSHOT_BYTES, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached value for key, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[2] > self.ttl):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries to stay within the limits."""
+        size = deep_sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self):
+        """Entry count, byte usage and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+def memory_report(infos):
+    """
+    Compare the footprint of raw info dicts with their snapshots.
+    `infos` maps ticker -> info dict. Returns a list of per-ticker rows plus a total row.
+    """
+    rows = []
+    for ticker, info in infos.items():
+        snapshot = FundamentalsSnapshot.from_info(info)
+        rows.append({
+            "ticker": ticker,
+            "info_keys": len(info),
+            "info_bytes": deep_sizeof(info),
+            "info_pickle_bytes": len(pickle.dumps(info, protocol=pickle.HIGHEST_PROTOCOL)),
+            "snapshot_bytes": deep_sizeof(snapshot),
+            "snapshot_pickle_bytes": len(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)),
+        })
+
+    total = {"ticker": "TOTAL"}
+    for column in ("info_keys", "info_bytes", "info_pickle_bytes", "snapshot_bytes", "snapshot_pickle_bytes"):
+        total[column] = sum(row[column] for row in rows)
+    return rows + [total]
+
+
+def main():
+    """Command line entry point: print the memory report for some tickers."""
+    import yfinance as yf
+
+    parser = argparse.ArgumentParser(description="Compare info dict and snapshot memory footprints")
+    parser.add_argument("tickers", nargs="+", help="Ticker symbols")
+    args = parser.parse_args()
+
+    infos = {ticker.upper(): yf.Ticker(ticker).info for ticker in args.tickers}
+    header = f"{'Ticker':<8}{'Keys':>6}{'Info bytes':>12}{'Info pickle':>13}{'Snapshot':>10}{'Snap pickle':>13}"
+    print(header)
+    print("-" * len(header))
+    for row in memory_report(infos):
+        print(f"{row['ticker']:<8}{row['info_keys']:>6}{row['info_bytes']:>12,}{row['info_pickle_bytes']:>13,}"
+              f"{row['snapshot_bytes']:>10,}{row['snapshot_pickle_bytes']:>13,}")
+
+
+if __name__ == "__main__":
+    main()
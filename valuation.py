@@ -0,0 +1,188 @@
+import math
+import warnings
+
+import numpy as np
+
+from snapshot import numeric_value
+
+# Default valuation assumptions
+RISK_FREE_RATE = 0.042
+EQUITY_RISK_PREMIUM = 0.055
+TERMINAL_GROWTH = 0.025
+PROJECTION_YEARS = 5
+
+# Sensitivity grid: discount rates are offsets around each ticker's CAPM rate,
+# growth rates are absolute annual free cash flow / dividend growth assumptions for the
+# projection years, after which both models grow at TERMINAL_GROWTH
+DISCOUNT_RATE_OFFSETS = np.array([-0.02, -0.01, 0.0, 0.01, 0.02])
+GROWTH_RATES = np.array([0.0, 0.03, 0.06, 0.09, 0.12, 0.15])
+
+# Bounds for the base-case growth estimate taken from reported growth
+MIN_BASE_GROWTH = 0.0
+MAX_BASE_GROWTH = 0.15
+
+# Graham's multiplier: 15x earnings times 1.5x book value
+GRAHAM_MULTIPLIER = 22.5
+
+
+def _field(infos, key):
+    """Pull one numeric field out of a list of info snapshots as a float array (NaN when missing)."""
+    return np.array([numeric_value(info.get(key)) for info in infos], dtype=float)
+
+
+def capm_discount_rate(beta, risk_free=RISK_FREE_RATE, premium=EQUITY_RISK_PREMIUM):
+    """Cost of equity from CAPM. Missing betas are treated as market beta (1.0)."""
+    beta = np.where(np.isnan(beta), 1.0, beta)
+    return risk_free + beta * premium
+
+
+def dcf_grid(fcf, shares, discount_rates, growth_rates,
+             terminal_growth=TERMINAL_GROWTH, years=PROJECTION_YEARS):
+    """
+    Per-share discounted cash flow value for every (ticker, discount rate, growth rate).
+
+    fcf, shares: arrays of shape (T,)
+    discount_rates: (T, D) or (D,)
+    growth_rates: (T, G) or (G,)
+    Returns an array of shape (T, D, G). Cells where the discount rate does not exceed
+    the terminal growth rate, or inputs are missing, are NaN.
+    """
+    fcf = np.asarray(fcf, dtype=float)
+    shares = np.asarray(shares, dtype=float)
+    count = len(fcf)
+    rates = np.broadcast_to(np.asarray(discount_rates, dtype=float), (count, np.shape(discount_rates)[-1]))
+    growth = np.broadcast_to(np.asarray(growth_rates, dtype=float), (count, np.shape(growth_rates)[-1]))
+
+    # Axes: ticker, discount rate, growth rate, projection year
+    r = rates[:, :, None, None]
+    g = growth[:, None, :, None]
+    periods = np.arange(1, years + 1)[None, None, None, :]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        projected = fcf[:, None, None, None] * (1 + g) ** periods
+        present = (projected / (1 + r) ** periods).sum(axis=-1)
+
+        # Gordon growth terminal value on the final projected year
+        final_year = projected[..., -1]
+        r_final = r[..., 0]
+        terminal = final_year * (1 + terminal_growth) / (r_final - terminal_growth)
+        terminal_present = terminal / (1 + r_final) ** years
+
+        values = (present + terminal_present) / shares[:, None, None]
+
+    values[np.broadcast_to(r_final <= terminal_growth, values.shape)] = np.nan
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def ddm_grid(dividend, discount_rates, growth_rates,
+             terminal_growth=TERMINAL_GROWTH, years=PROJECTION_YEARS):
+    """
+    Two-stage dividend discount value per share for every (ticker, discount rate, growth rate):
+    dividends grow at each growth rate for `years`, then at `terminal_growth` forever, like
+    dcf_grid. Shapes follow dcf_grid. Cells without a dividend are NaN.
+    """
+    dividend = np.asarray(dividend, dtype=float)
+    values = dcf_grid(dividend, np.ones_like(dividend), discount_rates, growth_rates, terminal_growth, years)
+    values[~(dividend > 0)] = np.nan
+    return values
+
+
+def graham_number(eps, book_value):
+    """Benjamin Graham's number: sqrt(22.5 * EPS * book value per share). NaN for losses or negative equity."""
+    eps = np.asarray(eps, dtype=float)
+    book_value = np.asarray(book_value, dtype=float)
+    product = GRAHAM_MULTIPLIER * eps * book_value
+    valid = (eps > 0) & (book_value > 0)
+    return np.where(valid, np.sqrt(np.where(valid, product, 0.0)), np.nan)
+
+
+def _base_growth(infos):
+    """Base-case growth per ticker: reported earnings growth, else revenue growth, clipped to a sane range."""
+    growth = _field(infos, "earningsGrowth")
+    revenue_growth = _field(infos, "revenueGrowth")
+    growth = np.where(np.isnan(growth), revenue_growth, growth)
+    growth = np.where(np.isnan(growth), MIN_BASE_GROWTH, growth)
+    return np.clip(growth, MIN_BASE_GROWTH, MAX_BASE_GROWTH)
+
+
+def _dividend_per_share(infos, price):
+    """Annual dividend per share, preferring the reported dividend rate over yield x price."""
+    rate = _field(infos, "dividendRate")
+    dividend_yield = _field(infos, "dividendYield")
+    return np.where(np.isnan(rate), dividend_yield * price, rate)
+
+
+def _clean(value):
+    """Convert a NumPy scalar to a rounded float, or None when missing."""
+    value = float(value)
+    return None if math.isnan(value) else round(value, 2)
+
+
+def compute_valuations(infos, offsets=DISCOUNT_RATE_OFFSETS, growth_rates=GROWTH_RATES):
+    """
+    Value many tickers at once from their yfinance info dicts.
+
+    Every method and the full discount-rate x growth-rate sensitivity grids are computed in
+    a single vectorised pass. Returns one summary dict per input, in the same order.
+    """
+    infos = list(infos)
+    if not infos:
+        return []
+
+    price = _field(infos, "currentPrice")
+    eps = _field(infos, "trailingEps")
+    book_value = _field(infos, "bookValue")
+    fcf = _field(infos, "freeCashflow")
+    shares = _field(infos, "sharesOutstanding")
+    beta = _field(infos, "beta")
+    dividend = _dividend_per_share(infos, price)
+
+    base_rate = capm_discount_rate(beta)
+    base_growth = _base_growth(infos)
+    grid_rates = base_rate[:, None] + np.asarray(offsets)[None, :]
+
+    # Sensitivity grids (T, D, G) and base-case values (T,)
+    dcf_values = dcf_grid(fcf, shares, grid_rates, growth_rates)
+    ddm_values = ddm_grid(dividend, grid_rates, growth_rates)
+    dcf_base = dcf_grid(fcf, shares, base_rate[:, None], base_growth[:, None])[:, 0, 0]
+    ddm_base = ddm_grid(dividend, base_rate[:, None], base_growth[:, None])[:, 0, 0]
+    graham = graham_number(eps, book_value)
+
+    methods = np.stack([dcf_base, ddm_base, graham, book_value], axis=1)
+    # Negative cash flows or equity give no meaningful per-share value
+    methods = np.where(methods > 0, methods, np.nan)
+    with warnings.catch_warnings():
+        # Tickers with no usable method produce all-NaN rows; NaN is the right answer there
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low = np.nanmin(methods, axis=1)
+        high = np.nanmax(methods, axis=1)
+        midpoint = np.nanmedian(methods, axis=1)
+        margin = np.where(midpoint > 0, (midpoint - price) / midpoint, np.nan)
+
+    results = []
+    for i in range(len(infos)):
+        results.append({
+            "current_price": _clean(price[i]),
+            "discount_rate": round(float(base_rate[i]), 4),
+            "base_growth": round(float(base_growth[i]), 4),
+            "terminal_growth": TERMINAL_GROWTH,
+            "projection_years": PROJECTION_YEARS,
+            "dcf": _clean(dcf_base[i]),
+            "ddm": _clean(ddm_base[i]),
+            "graham_number": _clean(graham[i]),
+            "book_value": _clean(book_value[i]),
+            "value_range": (_clean(low[i]), _clean(high[i])),
+            "median_value": _clean(midpoint[i]),
+            "margin_of_safety": None if math.isnan(margin[i]) else round(float(margin[i]), 4),
+            "grid_discount_rates": [round(float(r), 4) for r in grid_rates[i]],
+            "grid_growth_rates": [round(float(g), 4) for g in growth_rates],
+            "dcf_grid": [[_clean(v) for v in row] for row in dcf_values[i]],
+            "ddm_grid": [[_clean(v) for v in row] for row in ddm_values[i]],
+        })
+    return results
+
+
+def compute_valuation(info):
+    """Valuation summary for a single ticker (see compute_valuations)."""
+    return compute_valuations([info])[0]